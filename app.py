@@ -1,14 +1,17 @@
 import sys
-import time
 import os
-import select
 import json
+import queue
+import threading
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
+from rich.live import Live
+from rich.spinner import Spinner
+from rich.table import Table
 from prompting import AppPrompts
+from response_cache import close_response_caches
 from session import SessionManager
-from threading import Event
 import logging
 
 console = Console()
@@ -23,15 +26,18 @@ class App:
         self.capture_interval = config.get('capture_interval', 15)
         self.app_prompts = AppPrompts(config)
         self.session = SessionManager(config)
-        self.user_input_queue = []
-        self.input_ready = Event()
+        # Actions for the main loop ("inquiry", "exit"), consumed with a blocking get
+        self.events = queue.Queue()
+        # Set while the input thread should watch stdin; cleared during inquiry mode
+        self.input_ready = threading.Event()
+        self.input_thread = None
         
-    def initialize_session(self, previous_session=None):
+    def initialize_session(self, previous_session=None, carried_summary=None):
         """Initialize or continue a session"""
         try:
             if previous_session:
                 try:
-                    self.session.create_new_session(continue_from=previous_session)
+                    self.session.create_new_session(continue_from=previous_session, carried_summary=carried_summary)
                     self.logger.debug(f"Successfully continued from previous session. New session ID: {self.session.current_session['session_id']}")
                     console.print("[green]✓[/] Continuing from previous session")
                 except Exception as e:
@@ -46,35 +52,138 @@ class App:
     def start_handlers(self):
         """Start the capture handler and input thread"""
         self.session.captures.start()
+        self.listen_for_input()
+
+    def listen_for_input(self):
+        """(Re)arm the input thread, starting it on first use."""
+        self.input_ready.set()
+        if self.input_thread is None:
+            self.input_thread = threading.Thread(target=self._check_for_input, name="input", daemon=True)
+            self.input_thread.start()
 
-        
     def _check_for_input(self):
-        """Check for user input"""
+        """Block on stdin and queue an inquiry when Enter is pressed.
+
+        The thread stays idle while inquiry mode owns stdin and is re-armed by listen_for_input.
+        """
         while True:
+            self.input_ready.wait()
             try:
-                if sys.stdin in select.select([sys.stdin], [], [], 0.1)[0]:
-                    line = sys.stdin.readline()
-                    if line.strip() == '':  # Enter key was pressed
-                        self.session.captures.pause()
-                        self.user_input_queue.append("inquiry")
-                        break
-            except (select.error, IOError) as e:
+                # Read the descriptor directly so a blocked read doesn't hold sys.stdin's lock at exit
+                line = os.read(sys.stdin.fileno(), 1024).decode(errors='replace')
+            except (OSError, ValueError) as e:
                 self.logger.error(f"Input error: {e}")
-                time.sleep(0.1)
-            except Exception as e:
-                self.logger.error(f"Unexpected error: {e}")
-                time.sleep(0.1)
-        
+                line = ''
+            if line == '':  # stdin closed
+                self.events.put("exit")
+                return
+            if line.strip() == '':  # Enter key was pressed
+                self.input_ready.clear()
+                self.session.captures.pause()
+                self.events.put("inquiry")
+
+    def shutdown(self):
+        """Stop capture and background work, close the session and the response cache."""
+        self.session.close_session()
+        close_response_caches()
+
+    def _stream_inquiry(self, user_input):
+        """Render the answer into the response panel as tokens arrive."""
+        response_text = Text(style="bold blue")
+        panel = Panel(response_text, title="CodeBuddy's Response", border_style="blue")
+
+        with Live(Spinner("dots", text=Text("Thinking...", style="bold green")), console=console, refresh_per_second=12) as live:
+            def on_text(chunk):
+                if not response_text.plain:
+                    live.update(panel)
+                response_text.append(chunk)
+
+            assistant_response = self.session.prompts.handle_user_inquiry(user_input, on_text=on_text)
+            # Show the final text even if nothing was streamed (e.g. an error message)
+            if response_text.plain != assistant_response:
+                response_text.plain = assistant_response
+            live.update(panel)
+
+    def _print_sessions(self, limit=10):
+        """Show the most recent sessions from the session catalog."""
+        table = Table(title="Recent sessions")
+        for column in ("Session", "Parent", "Frames", "MB", "Duration", "Models", "Objective"):
+            table.add_column(column)
+        for s in self.session.catalog.list_sessions(limit=limit):
+            table.add_row(
+                s["session_id"],
+                s["parent_session_id"] or "",
+                str(s["frame_count"]),
+                f"{s['bytes'] / 1e6:.1f}",
+                f"{s['duration_seconds'] / 60:.0f} min",
+                ", ".join(s["models"]),
+                s["objective"] or "",
+            )
+        console.print(table)
+        stats = self.session.catalog.stats()
+        console.print(
+            f"[dim]{stats['sessions']} sessions, {stats['frames']} frames, "
+            f"{stats['bytes'] / 1e6:.1f} MB, {stats['seconds'] / 3600:.1f} hours captured[/]"
+        )
+
+    def _print_stats(self):
+        """Show stage timings, token usage per model and counters for the current session."""
+        snapshot = self.session.metrics.snapshot()
+
+        timings = Table(title="Timings (ms)")
+        for column in ("Stage", "Count", "p50", "p95", "p99", "Max"):
+            timings.add_column(column, justify="left" if column == "Stage" else "right")
+        for name, stats in sorted(snapshot["observations"].items()):
+            if name.endswith("_seconds"):
+                timings.add_row(
+                    name.removesuffix("_seconds"), str(stats["count"]),
+                    *(f"{stats[key] * 1000:.1f}" for key in ("p50", "p95", "p99", "max")),
+                )
+        console.print(timings)
+
+        usage = Table(title="Token usage")
+        for column in ("Model", "Requests", "Input", "Output", "Seconds"):
+            usage.add_column(column, justify="left" if column == "Model" else "right")
+        for model, stats in sorted(snapshot["usage"].items()):
+            usage.add_row(model, str(stats["requests"]), str(stats["input_tokens"]), str(stats["output_tokens"]), f"{stats['seconds']:.1f}")
+        if snapshot["usage"]:
+            totals = {key: sum(stats[key] for stats in snapshot["usage"].values()) for key in ("requests", "input_tokens", "output_tokens", "seconds")}
+            usage.add_row("[bold]Session[/]", str(totals["requests"]), str(totals["input_tokens"]), str(totals["output_tokens"]), f"{totals['seconds']:.1f}")
+        console.print(usage)
+
+        budget = self.session.budget
+        if budget:
+            state = budget.snapshot()
+            limit = f" of ${state['session_cost_limit']:.2f}" if state['session_cost_limit'] else ""
+            steps = ", ".join(state["applied_steps"]) or "none"
+            console.print(
+                f"Budget: ${state['session_cost']:.4f}{limit} spent, vision model {self.session.prompts.vision.model}, "
+                f"degradations applied: {steps}" + (", [red]vision paused[/]" if state["vision_paused"] else "")
+            )
+
+        cache = self.session.prompts.cache
+        if cache:
+            state = cache.stats()
+            console.print(
+                f"Response cache: {state['hits']} hits, {state['misses']} misses ({state['hit_rate']:.0%} hit rate), "
+                f"{state['entries']} entries, {state['bytes'] / 1e6:.1f} MB, {state['evictions']} evicted"
+            )
+
+        if snapshot["counters"]:
+            console.print("[dim]" + ", ".join(f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())) + "[/]")
+        if self.session.metrics_server:
+            console.print(f"[dim]Prometheus metrics at {self.session.metrics_server.url}[/]")
+
     def prompt_user(self):
-        """Handle user prompts and commands"""
+        """Handle user prompts and commands. Returns False when the user asks to exit."""
         while True:
             try:
-                user_input = console.input("\n[bold green]Enter your question[/] ([dim]'exit' to quit, 'reset' to clear, 'continue' to resume[/]): ")
+                user_input = console.input("\n[bold green]Enter your question[/] ([dim]'exit' to quit, 'reset' to clear, 'sessions' to list, 'stats' for metrics, 'continue' to resume[/]): ")
                 
                 if not user_input:
                     self.session.captures.resume()
                     console.print("[green]✓[/] Resuming screen capture...")
-                    return
+                    return True
                     
                 if user_input.lower() == 'reset':
                     self.initialize_session()
@@ -82,23 +191,20 @@ class App:
                     os.system('cls' if os.name == 'nt' else 'clear')
                     console.print(f"[green]✓[/] Log cleared and new session created {self.session.current_session['session_id']}")
                     console.print("[green]✓[/] Resuming screen capture...")
-                    return
+                    return True
                 elif user_input.lower() == 'continue':
                     self.session.captures.resume()
                     console.print("[green]✓[/] Resuming screen capture...")
-                    return
+                    return True
+                elif user_input.lower() == 'sessions':
+                    self._print_sessions()
+                elif user_input.lower() == 'stats':
+                    self._print_stats()
                 elif user_input.lower() == 'exit':
                     console.print("[red]Exiting. Remember to stay hydrated! 💧[/]")
-                    os._exit(0)
+                    return False
                 else:
-                    with console.status("[bold green]Thinking...[/]", spinner="dots"):
-                        assistant_response = self.session.prompts.handle_user_inquiry(user_input)
-                    
-                    console.print(Panel(
-                        Text(assistant_response, style="bold blue"),
-                        title="CodeBuddy's Response",
-                        border_style="blue"
-                    ))
+                    self._stream_inquiry(user_input)
             except (EOFError, KeyboardInterrupt):
                 console.print("\n[yellow]Input interrupted. Type 'exit' to quit or 'continue' to resume capture.[/]")
                 continue
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""Compare CPU time and payload per frame of full-desktop and active-window capture.
+
+Usage: python -m benchmarks.bench_capture_region [--monitors 3] [--runs 10] [--format webp]
+
+A synthetic multi-monitor desktop is grabbed through the capture backend API, resized
+to fit max_image_size and encoded, as SessionCaptures does for each frame. CPU time is
+reported for grab+resize and for encoding, with the bytes and image sizes sent. Modes:
+- screen: the whole desktop
+- window: only the active window plus padding
+- window+thumbnail: the active window plus a thumbnail of the whole desktop
+"""
+import argparse
+import statistics
+import time
+
+from PIL import Image
+
+from benchmarks.bench_encode import synthetic_screen
+from capture_backends import CaptureBackend, WindowInfo, window_box
+from utils import encode_image, resize_image
+
+THUMBNAIL_SIZE = (480, 270)
+
+
+class DesktopBackend(CaptureBackend):
+    """Serves a fixed in-memory desktop, so only capture-side work is measured."""
+
+    name = "bench"
+
+    def __init__(self, desktop):
+        self.desktop = desktop
+
+    def grab(self):
+        return self.desktop.copy()
+
+    def grab_region(self, box):
+        return self.desktop.crop(box)
+
+
+def synthetic_desktop(monitors, monitor_size=(1920, 1080)):
+    desktop = Image.new("RGB", (monitor_size[0] * monitors, monitor_size[1]))
+    for index in range(monitors):
+        desktop.paste(synthetic_screen(monitor_size), (index * monitor_size[0], 0))
+    return desktop
+
+
+def capture_frame(backend, mode, window):
+    """One frame's grab and resize. Returns the images to encode."""
+    if mode == "screen":
+        return [resize_image(backend.grab())]
+
+    box = window_box(window.bounds, 16)
+    if mode == "window":
+        return [resize_image(backend.grab_region(box))]
+    desktop = backend.grab()
+    image = resize_image(desktop.crop(box))
+    return [image, resize_image(desktop, THUMBNAIL_SIZE)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--monitors", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--format", default="webp")
+    parser.add_argument("--quality", type=int, default=80)
+    args = parser.parse_args()
+
+    desktop = synthetic_desktop(args.monitors)
+    backend = DesktopBackend(desktop)
+    # An editor window on the middle monitor
+    monitor = args.monitors // 2
+    window = WindowInfo("editor", "Editor", (monitor * 1920 + 100, 60, 1600, 960))
+
+    print(f"{args.monitors} monitors ({desktop.width}x{desktop.height}), window {window.bounds[2]}x{window.bounds[3]}, "
+          f"{args.format} quality {args.quality}")
+    baseline = None
+    for mode in ("screen", "window", "window+thumbnail"):
+        capture_cpu, encode_cpu = [], []
+        for _ in range(args.runs):
+            start = time.process_time()
+            images = capture_frame(backend, mode, window)
+            encode_start = time.process_time()
+            payloads = [encode_image(image, args.format, args.quality) for image in images]
+            capture_cpu.append(encode_start - start)
+            encode_cpu.append(time.process_time() - encode_start)
+        capture_ms, encode_ms = statistics.median(capture_cpu) * 1000, statistics.median(encode_cpu) * 1000
+        nbytes = sum(len(payload.data) for payload in payloads)
+        baseline = baseline or capture_ms
+        print(f"  {mode:<17} grab+resize {capture_ms:7.1f}ms ({baseline / capture_ms:4.1f}x)  encode {encode_ms:6.1f}ms  "
+              f"{nbytes / 1024:7.1f} KiB/frame  sent {' + '.join(f'{image.width}x{image.height}' for image in images)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Top-k latency of ContextHandler.get_relevant_context at 100k context items.
+
+Usage: python -m benchmarks.bench_context [--items 100000] [--limit 10] [--queries 200]
+
+Compares the indexed lookup with the previous approach of sorting every item and
+scanning all paths and metadata on each call.
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from context import ContextHandler, ContextItem
+
+WORDS = ["capture", "session", "budget", "metrics", "prompt", "utils", "trace", "index", "store", "cascade",
+         "scheduler", "backend", "pipeline", "summary", "catalog", "region", "encode", "transport", "cache", "window"]
+
+
+def synthetic_items(count, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for number in range(count):
+        path = "/repo/" + "/".join(rng.choice(WORDS) for _ in range(3)) + f"_{number}.py"
+        metadata = {"title": f"{rng.choice(WORDS)} notes {number}"} if number % 10 == 0 else {}
+        items.append(ContextItem(type="source", path=path, metadata=metadata,
+                                 priority=rng.choice((0, 0, 0, 5, 10)), last_accessed=rng.random() * 1e6))
+    return items
+
+
+def scan_top(handler, query, limit):
+    """The previous get_relevant_context: full sort and substring scan per call."""
+    items = list(handler.context_items.values())
+    items.sort(key=lambda x: (-x.priority, -x.last_accessed))
+    if query:
+        items = [item for item in items if query.lower() in item.path.lower() or
+                 any(query.lower() in str(v).lower() for v in item.metadata.values())]
+    return items[:limit]
+
+
+def timed(function, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    items = synthetic_items(args.items)
+    with tempfile.TemporaryDirectory() as session_dir:
+        handler = ContextHandler(session_dir)
+        start = time.perf_counter()
+        with handler.batch():
+            for item in items:
+                handler._put(item)
+        print(f"{args.items} items indexed and saved in {time.perf_counter() - start:.2f}s")
+
+        rng = random.Random(1)
+        workloads = {
+            "no query": [None] * args.queries,
+            "common word": [rng.choice(WORDS) for _ in range(args.queries)],
+            "selective": [f"_{rng.randrange(args.items)}.py" for _ in range(args.queries)],
+            "short (2 chars)": [rng.choice(WORDS)[:2] for _ in range(args.queries)],
+            "no match": ["zzqx"] * args.queries,
+        }
+        baseline_queries = max(args.queries // 20, 3)
+        for name, queries in workloads.items():
+            indexed_p50, indexed_p99 = timed(lambda query: handler.get_relevant_context(query, args.limit), queries)
+            scan_p50, _ = timed(lambda query: scan_top(handler, query, args.limit), queries[:baseline_queries])
+            print(f"  {name:<16} indexed p50 {indexed_p50:7.3f}ms  p99 {indexed_p99:7.3f}ms   "
+                  f"sort+scan p50 {scan_p50:8.1f}ms  ({scan_p50 / indexed_p50:6.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
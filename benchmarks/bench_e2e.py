@@ -0,0 +1,244 @@
+"""Replay screenshots through SessionCaptures -> SessionPrompts -> trace log against a stub model server.
+
+Usage: python -m benchmarks.bench_e2e [--corpus dir] [--frames 60] [--latency 0.3] [--jitter 0.2]
+                                      [--rate-limit 0.05] [--dialect openai] [--output results.json]
+                                      [--cascade [--local-latency 0.05] [--novel-rate 0.3] [--sensitive-rate 0.05]]
+
+Without --corpus a synthetic session is generated: typing in an editor, idle stretches
+with an unchanged screen, and window switches. The JSON report has per-stage latency
+percentiles, throughput, bytes uploaded and tokens per frame, tagged with the git
+commit so results can be compared across commits.
+
+With --cascade a second stub server plays the local privacy_vision_model. It answers
+each frame's triage with a verdict that marks novel_rate of frames as new and
+sensitive_rate as sensitive, so only some frames reach the remote stub.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from PIL import ImageDraw
+
+from benchmarks.bench_encode import synthetic_screen
+from benchmarks.bench_streaming import stub_provider
+from benchmarks.stub_server import StubModelServer
+
+VISION_REPLY = "The user is editing capture.py in their editor and adding a scheduler to the capture loop."
+
+
+def write_synthetic_corpus(directory, frames, seed=0):
+    """Write an editor session as numbered PNGs: mostly small edits, some idle and window switches."""
+    rng = random.Random(seed)
+    editor = synthetic_screen()
+    browser = synthetic_screen()
+    ImageDraw.Draw(browser).rectangle((0, 0, browser.width, 120), fill=(230, 230, 235))
+    screens = [editor, browser]
+    current = 0
+    for index in range(frames):
+        roll = rng.random()
+        if roll < 0.15:
+            current = 1 - current
+        elif roll < 0.7:
+            # Rewrite a block of lines, as when typing or pasting code
+            screen = screens[current]
+            draw = ImageDraw.Draw(screen)
+            top = rng.randrange(40, screen.height - 400, 18)
+            shade = rng.randrange(30, 70)
+            draw.rectangle((230, top, screen.width - 40, top + 360), fill=(shade, shade, shade + 10))
+            for line in range(20):
+                draw.text((240, top + line * 18), f"value_{index}_{line} = compute({rng.randrange(1000)})" * 3, fill=(220, 220, 120))
+        # otherwise idle: the same screen again
+        screens[current].save(os.path.join(directory, f"frame_{index:05d}.png"))
+
+
+def vision_reply(payload):
+    """Stub reply for the remote tier: plain text, or the batch JSON when several screenshots are sent."""
+    frames = {int(number) for number in re.findall(r"Screenshot (\d+) ", json.dumps(payload))}
+    if not frames:
+        return VISION_REPLY
+    return json.dumps({"frames": [{"frame": number, "description": VISION_REPLY} for number in sorted(frames)]})
+
+
+def triage_reply(novel_rate, sensitive_rate, seed=0):
+    """Stub reply for the local tier: a triage verdict drawn at the given rates."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def reply(payload):
+        with lock:
+            novel, sensitive = rng.random() < novel_rate, rng.random() < sensitive_rate
+        return json.dumps({
+            "description": "The user is editing code in their editor.",
+            "confidence": 0.9,
+            "novelty": 0.8 if novel else 0.1,
+            "sensitive": sensitive,
+            "reason": "credentials visible" if sensitive else "",
+        })
+    return reply
+
+
+def bench_config(corpus, server_url, sessions_dir, dialect, args, local_url=None):
+    with open("config.json") as f:
+        config = json.load(f)
+    provider = stub_provider(f"bench-{dialect}", server_url, dialect)
+    provider["max_concurrency"] = args.workers
+    provider["backoff_base"] = 0.05
+    model = provider["models"][0]
+    config.update({
+        "screen_vision_model": model,
+        "qa_model": model,
+        "privacy_vision_model": model,
+        "summary_model": model,
+        "custom_providers": [provider],
+        "session_dir": sessions_dir,
+        "response_cache_enabled": False,
+        "capture_backend": "replay",
+        "capture_replay_dir": corpus,
+        # Frames are driven by the benchmark, keep the capture loop idle
+        "capture_interval": 24 * 3600,
+        "capture_min_interval": 24 * 3600,
+        "capture_max_interval": 24 * 3600,
+        "window_poll_interval": 0,
+        "inference_workers": args.workers,
+        "shutdown_timeout": None,
+        "metrics_port": None,
+    })
+    if args.batch_size:
+        config["vision_batch_size"] = args.batch_size
+    if local_url:
+        local = stub_provider("bench-local", local_url, "openai")
+        config["custom_providers"].append(local)
+        config.update({"privacy_vision_model": local["models"][0], "vision_cascade": True})
+    else:
+        config["vision_cascade"] = False
+    return config
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, corpus):
+    from session import SessionManager
+
+    frames = len([f for f in os.listdir(corpus) if not f.endswith(".json")])
+    with contextlib.ExitStack() as stack:
+        server = stack.enter_context(StubModelServer(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                                                     reply=vision_reply, seed=args.seed))
+        local_server = None
+        if args.cascade:
+            local_server = stack.enter_context(StubModelServer(
+                latency=args.local_latency, reply=triage_reply(args.novel_rate, args.sensitive_rate, args.seed)
+            ))
+        sessions_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        config = bench_config(corpus, server.base_url, sessions_dir, args.dialect, args,
+                              local_url=local_server.base_url if local_server else None)
+        session = SessionManager(config)
+        session.create_new_session()
+        captures = session.captures
+
+        start = time.monotonic()
+        outcomes = {}
+        for index in range(frames):
+            if args.interval:
+                time.sleep(max(0.0, start + index * args.interval - time.monotonic()))
+            outcome = captures.capture_screen()
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        captured = time.monotonic() - start
+        session.close_session()
+        elapsed = time.monotonic() - start
+
+        snapshot = session.metrics.snapshot()
+        described = sum(1 for _ in session.trace_log.records(kinds=("vision",)))
+        observations = snapshot["observations"]
+        counters = snapshot["counters"]
+        bytes_sent = observations.get("bytes_sent_per_frame", {}).get("total", 0)
+        tokens = counters.get("vision_input_tokens", 0) + counters.get("vision_output_tokens", 0)
+        stages = {
+            name: {key: stats[key] for key in ("count", "mean", "p50", "p95", "p99", "max")}
+            for name, stats in sorted(observations.items())
+            if name.startswith("stage_") or name in ("frame_latency_seconds", "model_request_seconds")
+        }
+        return {
+            "commit": git_commit(),
+            "parameters": {
+                "frames": frames,
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "rate_limit": args.rate_limit,
+                "dialect": args.dialect,
+                "workers": args.workers,
+                "interval": args.interval,
+                "vision_batch_size": config.get("vision_batch_size", 1),
+                "image_format": config.get("image_format"),
+                "cascade": args.cascade,
+            },
+            "elapsed_seconds": elapsed,
+            "capture_seconds": captured,
+            "throughput_frames_per_second": frames / elapsed if elapsed else None,
+            "outcomes": outcomes,
+            "frames_described": described,
+            "frames_dropped": captures.pipeline.dropped_frames,
+            "vision_requests": counters.get("vision_requests", 0),
+            "server_requests": server.requests_served,
+            "server_rate_limited": server.rate_limited,
+            "local_server_requests": local_server.requests_served if local_server else 0,
+            "cascade_routes": {route: counters.get(f"cascade_{route}", 0) for route in ("local", "remote", "private", "errors")},
+            "bytes_uploaded": bytes_sent,
+            "bytes_per_sent_frame": bytes_sent / outcomes.get("changed", 1) if outcomes.get("changed") else 0,
+            "tokens_total": tokens,
+            "tokens_per_described_frame": tokens / described if described else 0,
+            "usage": snapshot["usage"],
+            "stages": stages,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of screenshots to replay (synthetic if omitted)")
+    parser.add_argument("--frames", type=int, default=60, help="synthetic frames to generate")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between captures (0: as fast as possible)")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--rate-limit", type=float, default=0.05, help="fraction of requests answered with 429")
+    parser.add_argument("--dialect", choices=("openai", "anthropic"), default="openai")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, help="override vision_batch_size")
+    parser.add_argument("--cascade", action="store_true", help="triage frames with a local stub model first")
+    parser.add_argument("--local-latency", type=float, default=0.05, help="latency of the local tier stub")
+    parser.add_argument("--novel-rate", type=float, default=0.3, help="fraction of frames the local tier escalates")
+    parser.add_argument("--sensitive-rate", type=float, default=0.05, help="fraction of frames the local tier keeps private")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as generated:
+        corpus = args.corpus
+        if not corpus:
+            corpus = generated
+            write_synthetic_corpus(corpus, args.frames, args.seed)
+        # Progress output from the capture path goes to stderr, keeping stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            report = run(args, corpus)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
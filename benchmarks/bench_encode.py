@@ -0,0 +1,58 @@
+"""Compare encode time and payload size of each screenshot wire format.
+
+Usage: python -m benchmarks.bench_encode [path/to/screenshot.png ...] [--runs 10]
+
+Without image paths a synthetic text-heavy screen is generated.
+"""
+import argparse
+import statistics
+import time
+
+from PIL import Image, ImageDraw
+
+from utils import IMAGE_FORMATS, MAX_IMAGE_SIZE, encode_image, resize_image
+
+
+def synthetic_screen(size=(2880, 1800)):
+    """A dark editor-like screen full of monospaced text."""
+    image = Image.new("RGB", size, (30, 30, 30))
+    draw = ImageDraw.Draw(image)
+    line = "    def process_screenshot(self, image, active_window_title, captured_at=None):  # 42"
+    for row, y in enumerate(range(10, size[1] - 20, 18)):
+        color = (200, 200, 200) if row % 5 else (120, 180, 255)
+        draw.text((10 + (row % 7) * 8, y), line[: 40 + row % 45], fill=color)
+    draw.rectangle((0, 0, 220, size[1]), fill=(45, 45, 48))
+    return image
+
+
+def bench(image, runs, quality):
+    results = []
+    for name in IMAGE_FORMATS:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            encoded = encode_image(image, name, quality)
+            timings.append(time.perf_counter() - start)
+        results.append((name, statistics.median(timings) * 1000, len(encoded.data)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--quality", type=int, default=80)
+    args = parser.parse_args()
+
+    sources = [(path, Image.open(path).convert("RGB")) for path in args.images] or [("synthetic", synthetic_screen())]
+    for label, image in sources:
+        image = resize_image(image)
+        print(f"{label} ({image.width}x{image.height}, fits {MAX_IMAGE_SIZE}, quality {args.quality})")
+        results = bench(image, args.runs, args.quality)
+        png_bytes = next(size for name, _, size in results if name == "png")
+        for name, encode_ms, size in results:
+            print(f"  {name:<5} encode {encode_ms:8.2f}ms  {size / 1024:9.1f} KiB  {png_bytes / size:5.1f}x smaller than png")
+
+
+if __name__ == "__main__":
+    main()
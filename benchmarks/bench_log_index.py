@@ -0,0 +1,105 @@
+"""Measure BM25 log index build time, query latency and retrieval quality.
+
+Usage: python -m benchmarks.bench_log_index [--entries 100000]
+
+Some synthetic entries are relevant to a labelled query (the migration script, a
+terminal error, a Slack message about the release). Recall@20 is the share of those
+found in the top 20 (out of at most 20). The same check runs on a 100-entry log where
+a tenth of the entries mention the migration script.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from log_index import BM25Index
+
+APPS = ["VS Code", "Terminal", "Chrome", "Slack", "Notion", "iTerm2", "Figma"]
+ACTIONS = ["editing", "reading", "scrolling through", "debugging", "reviewing", "searching in", "running tests for"]
+FILES = ["app.py", "session.py", "capture.py", "README.md", "config.json", "utils.py", "prompting.py"]
+WORDS = [f"identifier{n}" for n in range(20_000)]
+
+QUERIES = [
+    "when did I last look at the migration script?",
+    "what was the error in the terminal",
+    "slack message about the release",
+    "identifier123 identifier4567",
+    "user is",
+]
+
+# Labelled queries: a phrase only the relevant entries contain
+RELEVANT = {
+    "when did I last look at the migration script?": "migration_script",
+    "what was the error in the terminal": "Terminal shows an error",
+    "slack message about the release": "about the release",
+}
+
+
+def synthetic_entry(n, rng, rare_every=5000):
+    entry = (
+        f"Active window: {rng.choice(APPS)}. The user is {rng.choice(ACTIONS)} {rng.choice(FILES)} "
+        f"and the screen shows {' '.join(rng.choices(WORDS, k=8))}."
+    )
+    if n % rare_every == 0:
+        entry += " The user opened db/migrate_users_migration_script.py"
+    elif n % rare_every == rare_every // 3:
+        entry += " Terminal shows an error: ModuleNotFoundError in the test run."
+    elif n % rare_every == 2 * rare_every // 3:
+        entry += " Slack shows a message from Sam about the release checklist."
+    elif n == rare_every // 2:
+        # Shares only a rare word ("last") with the migration query
+        entry += " Slack: the user reads the last line of a long thread."
+    return entry
+
+
+def recall(index, entries, k=20):
+    """Recall@k of each labelled query over entries."""
+    results = {}
+    for query, phrase in RELEVANT.items():
+        relevant = {n for n, entry in enumerate(entries) if phrase in entry}
+        found = {doc_id for doc_id, _ in index.search(query, k=k)}
+        results[query] = len(relevant & found) / min(len(relevant), k) if relevant else 1.0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    entries = [synthetic_entry(n, rng) for n in range(args.entries)]
+
+    index = BM25Index()
+    start = time.perf_counter()
+    for entry in entries:
+        index.add(entry)
+    build = time.perf_counter() - start
+    print(f"built index over {len(index)} entries in {build:.2f}s ({build / len(index) * 1e6:.1f}µs per entry)")
+
+    rng = random.Random(1)
+    small = [synthetic_entry(n, rng, rare_every=10) for n in range(100)]
+    small_index = BM25Index()
+    for entry in small:
+        small_index.add(entry)
+    small_recall = recall(small_index, small)
+    large_recall = recall(index, entries)
+    print("recall@20 (100 entries / full log):")
+    for query in RELEVANT:
+        print(f"  {query!r:<50} {small_recall[query]:5.2f} / {large_recall[query]:5.2f}")
+
+    print("query latency:")
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = index.search(query, k=20)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"  {query!r:<50} p50 {statistics.median(timings) * 1000:6.3f}ms  "
+              f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:6.3f}ms  hits {len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Compare time-to-first-token of streamed answers with blocking requests.
+
+Usage: python -m benchmarks.bench_streaming [--latency 0.5] [--token-latency 0.02]
+"""
+import argparse
+import time
+
+from benchmarks.stub_server import StubModelServer
+from prompting import Client
+
+REPLY = " ".join(f"token{n}" for n in range(100))
+
+
+def stub_provider(name, base_url, dialect):
+    mapping = (
+        {"content": "choices.0.message.content", "model": "model", "usage": "usage"}
+        if dialect == "openai"
+        else {"content": "content.0.text", "model": "model", "usage": "usage"}
+    )
+    return {
+        "provider": name,
+        "base_url": base_url,
+        "chat_completions_url": "v1/chat/completions" if dialect == "openai" else "v1/messages",
+        "models": [f"{name}-model"],
+        "response_mapping": mapping,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    messages = [{"role": "user", "content": "What did I do in the last hour?"}]
+    with StubModelServer(latency=args.latency, token_latency=args.token_latency, reply=REPLY) as server:
+        for dialect in ("openai", "anthropic"):
+            provider = stub_provider(f"stub-{dialect}", server.base_url, dialect)
+            client = Client({"model": provider["models"][0]}, providers=[provider])
+
+            start = time.monotonic()
+            client.create_chat_completion(messages)
+            blocking = time.monotonic() - start
+
+            chunks = []
+            response = client.stream_chat_completion(messages, on_text=chunks.append)
+            assert response["content"] == REPLY, response["content"][:80]
+            latency = response["latency"]
+            print(f"{dialect:<9} blocking {blocking:6.3f}s  streamed ttft {latency['time_to_first_token']:6.3f}s  "
+                  f"total {latency['total']:6.3f}s  chunks {len(chunks)}  usage {response['usage']}")
+
+
+if __name__ == "__main__":
+    main()
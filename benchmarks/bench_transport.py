@@ -0,0 +1,61 @@
+"""Compare one-off requests.post calls against the pooled ProviderTransport.
+
+Usage: python -m benchmarks.bench_transport [--requests 200]
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+from benchmarks.stub_server import StubModelServer
+from transport import ProviderTransport
+
+PAYLOAD = {"model": "stub-model", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 16}
+
+
+def timed_calls(call, count):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = call()
+        response.raise_for_status()
+        response.json()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name, timings, connections):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1000
+    p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{name:<22} total {sum(timings):7.3f}s  p50 {p50:6.2f}ms  p95 {p95:6.2f}ms  connections {connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with StubModelServer() as server:
+        url = f"{server.base_url}v1/chat/completions"
+
+        before = server.connections_opened
+        timings = timed_calls(lambda: requests.post(url, json=PAYLOAD, timeout=60), args.requests)
+        summarize("requests.post", timings, server.connections_opened - before)
+
+        transport = ProviderTransport({"provider": "stub", "base_url": server.base_url})
+        before = server.connections_opened
+        timings = timed_calls(lambda: transport.post(url, headers={}, json=PAYLOAD), args.requests)
+        summarize("ProviderTransport", timings, server.connections_opened - before)
+        transport.close()
+
+        server.status_sequence = [429, 503]
+        transport = ProviderTransport({"provider": "stub", "base_url": server.base_url, "backoff_base": 0.01})
+        response = transport.post(url, headers={}, json=PAYLOAD)
+        print(f"retry check: 429 -> 503 -> {response.status_code} after {server.requests_served} total requests")
+        transport.close()
+
+
+if __name__ == "__main__":
+    main()
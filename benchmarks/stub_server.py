@@ -0,0 +1,205 @@
+"""Local stand-in for OpenAI/Anthropic-compatible chat endpoints.
+
+Run standalone with `python -m benchmarks.stub_server --port 8765` and point a
+`custom_providers` entry at it, or start it in-process with StubModelServer.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubModelServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, status_sequence=None, reply="Stub response",
+                 token_latency=0.0, jitter=0.0, rate_limit=0.0, image_tokens=765, seed=None):
+        self.latency = latency
+        # Extra uniformly random delay of up to `jitter` seconds per request
+        self.jitter = jitter
+        # Probability that a request is answered with 429 (after any status_sequence)
+        self.rate_limit = rate_limit
+        # Input tokens charged per attached image, roughly a high-detail 1024px image
+        self.image_tokens = image_tokens
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        # Delay between streamed tokens when the request asks for "stream": true
+        self.token_latency = token_latency
+        # Optional list of status codes returned by successive requests before answering 200
+        self.status_sequence = list(status_sequence or [])
+        # A string, or a callable taking the request payload and returning the reply text
+        self.reply = reply
+        self.requests_served = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_status(self):
+        with self._lock:
+            self.requests_served += 1
+            if self.status_sequence:
+                status = self.status_sequence.pop(0)
+            elif self.rate_limit and self._random.random() < self.rate_limit:
+                status = 429
+            else:
+                status = 200
+            if status == 429:
+                self.rate_limited += 1
+            return status
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + jitter
+
+    def input_tokens(self, payload):
+        """Rough input token count: ~4 characters per text token plus image_tokens per image."""
+        text_chars, images = len(payload.get("system") or ""), 0
+        for message in payload.get("messages", []):
+            content = message.get("content")
+            parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+            for part in parts:
+                if part.get("type") == "text":
+                    text_chars += len(part.get("text", ""))
+                elif part.get("type") in ("image_url", "image"):
+                    images += 1
+        return text_chars // 4 + images * self.image_tokens
+
+    def reply_text(self, payload):
+        return self.reply(payload) if callable(self.reply) else self.reply
+
+    def completion_body(self, path, payload):
+        model = payload.get("model", "stub")
+        reply = self.reply_text(payload)
+        usage_in, usage_out = self.input_tokens(payload), len(reply.split())
+        if path.rstrip("/").endswith("messages"):
+            return {
+                "model": model,
+                "content": [{"type": "text", "text": reply}],
+                "usage": {"input_tokens": usage_in, "output_tokens": usage_out},
+            }
+        return {
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": usage_in, "completion_tokens": usage_out, "total_tokens": usage_in + usage_out},
+        }
+
+    def stream_events(self, path, payload):
+        """SSE data payloads for a streamed reply, in the OpenAI or Anthropic dialect."""
+        model = payload.get("model", "stub")
+        words = self.reply_text(payload).split(" ")
+        tokens = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+        usage_in = self.input_tokens(payload)
+        if path.rstrip("/").endswith("messages"):
+            yield {"type": "message_start", "message": {"model": model, "usage": {"input_tokens": usage_in, "output_tokens": 0}}}
+            for token in tokens:
+                yield {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}}
+            yield {"type": "message_delta", "usage": {"output_tokens": len(tokens)}}
+            yield {"type": "message_stop"}
+            return
+        for token in tokens:
+            yield {"model": model, "choices": [{"index": 0, "delta": {"content": token}}]}
+        yield {"model": model, "choices": [], "usage": {"prompt_tokens": usage_in, "completion_tokens": len(tokens)}}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections_opened += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                delay = server._delay()
+                if delay:
+                    time.sleep(delay)
+                status = server._next_status()
+                if status != 200:
+                    headers = {"Retry-After": "0"} if status == 429 else None
+                    self._send_json(status, {"error": {"message": f"stub status {status}"}}, headers)
+                    return
+                if payload.get("stream"):
+                    self._send_stream(payload)
+                    return
+                self._send_json(200, server.completion_body(self.path, payload))
+
+            def _send_stream(self, payload):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for event in server.stream_events(self.path, payload):
+                    if server.token_latency:
+                        time.sleep(server.token_latency)
+                    # Raw UTF-8 and no charset in Content-Type, like many local servers
+                    self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                if not self.path.rstrip("/").endswith("messages"):
+                    self.wfile.write(b"data: [DONE]\n\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI/Anthropic-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--reply", default="Stub response")
+    args = parser.parse_args()
+
+    server = StubModelServer(args.host, args.port, latency=args.latency, reply=args.reply, token_latency=args.token_latency,
+                             jitter=args.jitter, rate_limit=args.rate_limit)
+    print(f"Stub model server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
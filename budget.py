@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from collections import deque
+
+BUDGET_WINDOWS = {"tokens_per_minute": 60, "tokens_per_hour": 3600}
+DEGRADE_STEPS = ("interval", "image_size", "model")
+
+
+class BudgetGovernor:
+    """Keeps token use and cost within the per-model limits in `model_budgets`.
+
+    Tokens are tracked per model over the last minute, the last hour and the whole
+    session. Cost is tracked across all models against `budget_session_cost`. When the
+    vision model passes warn_fraction of any limit, the next degradation step is applied,
+    at most one per cooldown:
+    - interval: lengthen the capture intervals
+    - image_size: shrink screenshots
+    - model: switch to the model's `fallback_model`
+    Once usage drops below recover_fraction, steps are undone in reverse order. If the
+    limit is reached with no steps left, screenshots are logged but not described.
+    Every decision is written to the trace log.
+    """
+
+    def __init__(self, session, budgets, session_cost_limit=None, steps=DEGRADE_STEPS, warn_fraction=0.8,
+                 recover_fraction=0.5, cooldown=60, interval_factor=2.0, image_scale=0.75, min_image_width=640):
+        self.session = session
+        self.budgets = budgets
+        self.session_cost_limit = session_cost_limit
+        self.steps = [step for step in steps if step in DEGRADE_STEPS]
+        self.warn_fraction = warn_fraction
+        self.recover_fraction = recover_fraction
+        self.cooldown = cooldown
+        self.interval_factor = interval_factor
+        self.image_scale = image_scale
+        self.min_image_width = min_image_width
+        self.logger = logging.getLogger('BudgetGovernor')
+        self.session_cost = 0.0
+        self.vision_paused = False
+        self._lock = threading.Lock()
+        self._recent = {}  # model -> deque of (monotonic time, tokens) within the last hour
+        self._session_tokens = {}
+        # Applied steps as (step, model, undo), most recent last
+        self._applied = []
+        self._last_change = float("-inf")
+
+    @classmethod
+    def from_config(cls, session):
+        """Returns None when no budgets are configured."""
+        config = session.config
+        budgets = config.get("model_budgets") or {}
+        if not budgets and not config.get("budget_session_cost"):
+            return None
+        return cls(
+            session,
+            budgets,
+            session_cost_limit=config.get("budget_session_cost"),
+            steps=config.get("budget_degrade_steps", DEGRADE_STEPS),
+            warn_fraction=config.get("budget_warn_fraction", 0.8),
+            recover_fraction=config.get("budget_recover_fraction", 0.5),
+            cooldown=config.get("budget_cooldown", 60),
+        )
+
+    def record(self, model, input_tokens, output_tokens, now=None):
+        """Account for one request's usage, then re-evaluate the budget."""
+        now = now if now is not None else time.monotonic()
+        limits = self.budgets.get(model, {})
+        with self._lock:
+            tokens = input_tokens + output_tokens
+            self._recent.setdefault(model, deque()).append((now, tokens))
+            self._session_tokens[model] = self._session_tokens.get(model, 0) + tokens
+            self.session_cost += (
+                input_tokens * limits.get("input_cost_per_million", 0)
+                + output_tokens * limits.get("output_cost_per_million", 0)
+            ) / 1_000_000
+        self.check(now)
+
+    def usage(self, model, now=None):
+        """Tokens used by model per window, and the highest fraction of any limit (cost included)."""
+        now = now if now is not None else time.monotonic()
+        limits = self.budgets.get(model, {})
+        with self._lock:
+            recent = self._recent.setdefault(model, deque())
+            while recent and recent[0][0] <= now - 3600:
+                recent.popleft()
+            used = {name: sum(tokens for t, tokens in recent if t > now - seconds) for name, seconds in BUDGET_WINDOWS.items()}
+            used["tokens_per_session"] = self._session_tokens.get(model, 0)
+            fractions = [used[name] / limits[name] for name in used if limits.get(name)]
+            if self.session_cost_limit:
+                fractions.append(self.session_cost / self.session_cost_limit)
+        return used, max(fractions, default=0.0)
+
+    def check(self, now=None):
+        """Degrade or recover based on the current vision model's usage."""
+        now = now if now is not None else time.monotonic()
+        model = self.session.prompts.vision.model
+        # Models degraded away from still count until their usage drops, so a fallback's
+        # fresh budget doesn't immediately switch back
+        with self._lock:
+            models = {model} | {degraded for _, degraded, _ in self._applied}
+        fraction = max(self.usage(m, now)[1] for m in models)
+        with self._lock:
+            if fraction >= self.warn_fraction:
+                if now - self._last_change < self.cooldown:
+                    return
+                if self._degrade(model, fraction):
+                    self._last_change = now
+                elif fraction >= 1.0 and not self.vision_paused:
+                    self.vision_paused = True
+                    self._last_change = now
+                    self._log("pause_vision", f"{model} is at {fraction:.0%} of its budget with nothing left to degrade, "
+                                              f"screenshots are logged without descriptions")
+            elif self.vision_paused and fraction < 1.0:
+                self.vision_paused = False
+                self._last_change = now
+                self._log("resume_vision", f"{model} is back to {fraction:.0%} of its budget, describing screenshots again")
+            elif fraction < self.recover_fraction and self._applied and now - self._last_change >= self.cooldown:
+                step, _, undo = self._applied.pop()
+                self._last_change = now
+                self._log(f"restore_{step}", f"{model} is at {fraction:.0%} of its budget, {undo()}")
+
+    def vision_allowed(self):
+        return not self.vision_paused
+
+    def _degrade(self, model, fraction):
+        """Apply the next step that still has room, preferring steps not applied yet.
+
+        Returns False if none could be applied.
+        """
+        applied = {step for step, _, _ in self._applied}
+        for step in sorted(self.steps, key=lambda step: step in applied):
+            result = getattr(self, f"_degrade_{step}")(model)
+            if result:
+                description, undo = result
+                self._applied.append((step, model, undo))
+                self._log(step, f"{model} is at {fraction:.0%} of its budget, {description}")
+                return True
+        return False
+
+    def _degrade_interval(self, model):
+        scheduler = self.session.captures.scheduler
+        if scheduler.base_interval * self.interval_factor > 3600:
+            return None
+        scheduler.scale(self.interval_factor)
+
+        def undo():
+            scheduler.scale(1 / self.interval_factor)
+            return f"capture interval restored to {scheduler.base_interval:g}s"
+        return f"capture interval lengthened to {scheduler.base_interval:g}s", undo
+
+    def _degrade_image_size(self, model):
+        captures = self.session.captures
+        previous = captures.max_image_size
+        width, height = int(previous[0] * self.image_scale), int(previous[1] * self.image_scale)
+        if width < self.min_image_width:
+            return None
+        captures.max_image_size = (width, height)
+
+        def undo():
+            captures.max_image_size = previous
+            return f"screenshot size restored to {previous[0]}x{previous[1]}"
+        return f"screenshots shrunk to fit {width}x{height}", undo
+
+    def _degrade_model(self, model):
+        prompts = self.session.prompts
+        fallback = self.budgets.get(model, {}).get("fallback_model")
+        if not fallback or not prompts.has_model(fallback):
+            return None
+        prompts.set_vision_model(fallback)
+
+        def undo():
+            prompts.set_vision_model(model)
+            return f"vision model switched back to {model}"
+        return f"vision model switched to {fallback}", undo
+
+    def _log(self, decision, message):
+        self.logger.info(message)
+        self.session.metrics.increment(f"budget_{decision}")
+        self.session.write_to_log(f"Budget: {message}", kind="budget", decision=decision)
+
+    def snapshot(self, now=None):
+        """Usage and limits per model, for display."""
+        now = now if now is not None else time.monotonic()
+        models = sorted(set(self._session_tokens) | set(self.budgets))
+        result = {}
+        for model in models:
+            used, fraction = self.usage(model, now)
+            result[model] = {"used": used, "limits": self.budgets.get(model, {}), "fraction": fraction}
+        return {
+            "models": result,
+            "session_cost": self.session_cost,
+            "session_cost_limit": self.session_cost_limit,
+            "applied_steps": [step for step, _, _ in self._applied],
+            "vision_paused": self.vision_paused,
+        }
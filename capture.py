@@ -1,24 +1,80 @@
+import logging
 import os
 import threading
 import time
+from dataclasses import dataclass
+from datetime import datetime
 
 from dotenv import load_dotenv
-from utils import capture_and_save_screenshot, get_active_window_title, get_active_window_id
+from utils import MAX_IMAGE_SIZE, encode_image, resize_image
+from capture_backends import get_capture_backend, window_box, ReplayFinished
+from capture_scheduler import CaptureScheduler
+from cascade import VisionCascade
+from frame_dedup import FrameDeduplicator
+from pipeline import InferencePipeline, OrderedLogWriter
+from region_diff import RegionDiffer, overview_image
+from screenshot_store import ScreenshotStore
 from rich.console import Console
 
 load_dotenv()
 is_debug = os.getenv("DEBUG") == "TRUE"
 print(f"is_debug: {is_debug}")
 print(f"DEBUG: {os.getenv('DEBUG')}")
+
+
+@dataclass
+class Frame:
+    seq: int
+    captured_at: datetime
+    window_title: str
+    filename: str
+    images: list  # (EncodedImage, caption) pairs sent to the vision model
+    queued_at: float = 0.0  # time.monotonic() when handed to the pipeline
+    image: object = None  # the resized PIL screenshot, kept for OCR
+
+
 class SessionCaptures:
     def __init__(self, session):
         self.session = session
-        self.interval = session.config.get('capture_interval', 15)
-        self.screenshot_counter = 0
+        config = session.config
+        self.interval = config.get('capture_interval', 15)
+        self.image_format = config.get('image_format', 'png')
+        self.image_quality = config.get('image_quality', 80)
+        self.max_image_size = tuple(config.get('max_image_size', MAX_IMAGE_SIZE))
+        # "window" crops screenshots to the active window (when the backend reports its bounds)
+        self.capture_region = config.get('capture_region', 'screen')
+        self.window_padding = config.get('capture_window_padding', 16)
+        thumbnail_size = config.get('capture_desktop_thumbnail', (480, 270))
+        self.desktop_thumbnail_size = tuple(thumbnail_size) if thumbnail_size else None
         self.paused = False
+        self.stopped = False
+        # Wakes the capture loop on pause, resume and stop
+        self._state_changed = threading.Condition()
         self.capture_thread = None
         self.starting_window_id = None
         self.console = Console()
+        self.logger = logging.getLogger('SessionCaptures')
+        self.backend = get_capture_backend(config)
+        self.scheduler = CaptureScheduler.from_config(config)
+        # Seconds between active-window checks; a window switch triggers an early capture
+        self.window_poll_interval = config.get('window_poll_interval', 0)
+        self.deduplicator = FrameDeduplicator.from_config(config)
+        self.region_differ = RegionDiffer.from_config(config)
+        self.overview_size = tuple(config.get('region_overview_size', (480, 270)))
+        # Mosaic batches tile one full frame per screenshot, so crops would be thrown away
+        self.full_frames_only = config.get('vision_batch_size', 1) > 1 and session.prompts.batch_mode == "mosaic"
+        self.cascade = VisionCascade.from_config(session)
+        self.store = ScreenshotStore.from_config(config, self.screenshots_dir)
+        self.log_writer = OrderedLogWriter(session.write_to_log)
+        self.pipeline = InferencePipeline(
+            self._process_batch,
+            self.log_writer,
+            workers=config.get('inference_workers') or session.prompts.vision_concurrency,
+            queue_size=config.get('pipeline_queue_size', 4),
+            backpressure=config.get('pipeline_backpressure', 'drop_oldest'),
+            batch_size=config.get('vision_batch_size', 1),
+            batch_wait=config.get('vision_batch_wait', 30),
+        )
         self._set_starting_window()
 
     @property
@@ -30,40 +86,279 @@ class SessionCaptures:
         return self.session.current_session["screenshots_dir"]
 
     def _set_starting_window(self):
-        self.starting_window_id = get_active_window_id()
+        # Recorded frames have no terminal window to skip
+        if self.backend.interactive:
+            self.starting_window_id = self.backend.active_window().id
+
+    def capture_screen(self, window=None):
+        """Capture one frame. Returns "changed", "unchanged" or "skipped" for the scheduler.
 
-    def capture_screen(self):
+        window is the backend's WindowInfo if the caller already queried it.
+        """
+        window = window or self.backend.active_window()
         # Skip capture if we're in the starting window
-        if not is_debug and get_active_window_id() == self.starting_window_id:
+        if not is_debug and window.id == self.starting_window_id:
             self.console.print("[yellow]Skipping capture[/], still in starting window")
-            return
+            return "skipped"
+
+        captured_at = datetime.now()
+        metrics = self.session.metrics
+        with metrics.timer("stage_grab_seconds"):
+            screenshot, desktop = self._grab(window)
+        metrics.observe("pixels_grabbed_per_frame", screenshot.width * screenshot.height)
+        with metrics.timer("stage_resize_seconds"):
+            screenshot = resize_image(screenshot, self.max_image_size)
+        seq = self.log_writer.reserve()
+        try:
+            return self._capture_frame(seq, window, screenshot, desktop, captured_at)
+        except Exception:
+            # Release the slot, or every later log entry waits for it
+            self.log_writer.skip(seq)
+            raise
+
+    def _capture_frame(self, seq, window, screenshot, desktop, captured_at):
+        """Dedup, encode and store a grabbed frame, then log it or hand it to the pipeline."""
+        active_window_title = window.title
+        metrics = self.session.metrics
+        with metrics.timer("stage_dedup_seconds"):
+            is_duplicate, first_seen, is_latest = self.deduplicator.check(screenshot, captured_at)
+        if is_duplicate:
+            since = first_seen.strftime("%H:%M:%S")
+            if is_latest:
+                self.console.print(f"[dim]Screen unchanged since {since}, skipping vision call[/]")
+                message = f"Screen unchanged since {since} (active window: {active_window_title})"
+            else:
+                self.console.print(f"[dim]Returned to screen first seen at {since}, skipping vision call[/]")
+                message = f"Returned to screen first seen at {since} (active window: {active_window_title})"
+            self.log_writer.commit(seq, [{"message": message, "kind": "capture", "window": active_window_title}], timestamp=captured_at)
+            return "unchanged"
 
-        active_window_title = get_active_window_title()
         self.console.print(f"[green]📸 Capturing screen[/] {active_window_title}")
-        filename, base64_image = capture_and_save_screenshot(
-            self.screenshot_counter, 
-            screenshots_dir=self.screenshots_dir
-        )
-        self.screenshot_counter += 1
+        with metrics.timer("stage_encode_seconds"):
+            encoded = encode_image(screenshot, self.image_format, self.image_quality)
+        filename = self.store.save(encoded, captured_at)
+        self.session.record_capture(len(encoded.data), self.session_prompts.vision.model)
+
+        with metrics.timer("stage_region_diff_seconds"):
+            # A frame that will push another out of the queue can't rely on it as a baseline
+            regions = self.region_differ.plan(screenshot, full_frame=self.full_frames_only or self.pipeline.full)
+        if regions == []:
+            message = f"No visible change (active window: {active_window_title})"
+            self.log_writer.commit(seq, [{"message": message, "kind": "capture", "window": active_window_title}], timestamp=captured_at)
+            return "unchanged"
+        with metrics.timer("stage_crop_encode_seconds"):
+            images, pixels_sent = self._images_to_send(screenshot, encoded, regions)
+            if desktop:
+                desktop_size = desktop.size
+                thumbnail = resize_image(desktop, self.desktop_thumbnail_size)
+                left, top, width, height = window.bounds
+                images.insert(0, (
+                    encode_image(thumbnail, self.image_format, self.image_quality),
+                    f"Thumbnail of the whole {desktop_size[0]}x{desktop_size[1]} desktop for context. "
+                    f"The active window at x={left}, y={top}, size {width}x{height} follows at full resolution.",
+                ))
+                pixels_sent += thumbnail.width * thumbnail.height
+
+        budget = self.session.budget
+        if budget:
+            budget.check()
+            if not budget.vision_allowed():
+                message = f"Screenshot not described, token budget exhausted (active window: {active_window_title})"
+                self.log_writer.commit(seq, [{"message": message, "kind": "capture", "filename": filename, "window": active_window_title}], timestamp=captured_at)
+                return "unchanged"
+
+        metrics.observe("pixels_sent_per_frame", pixels_sent)
+        metrics.observe("bytes_sent_per_frame", sum(len(image.data) for image, _ in images))
+        metrics.increment("frames_cropped" if regions else "frames_full")
 
-        self.session_prompts.process_screenshot(base64_image, filename, active_window_title)
+        self.pipeline.submit(Frame(seq, captured_at, active_window_title, filename, images, queued_at=time.monotonic(),
+                                   image=screenshot if self.session_prompts.ocr else None))
+        self.region_differ.sent(screenshot, regions)
+        return "changed"
+
+    def _grab(self, window):
+        """Grab the frame to describe, and the full desktop when a thumbnail of it is wanted.
+
+        In window mode the frame is the active window plus padding. Without a thumbnail
+        only that area is grabbed.
+        """
+        if self.capture_region != "window" or not window.bounds:
+            return self.backend.grab(), None
+        box = window_box(window.bounds, self.window_padding)
+        if not self.desktop_thumbnail_size:
+            return self.backend.grab_region(box), None
+        desktop = self.backend.grab()
+        return desktop.crop(self.backend.image_box(box, desktop.size)), desktop
+
+    def _images_to_send(self, screenshot, encoded, regions):
+        """Return the (image, caption) pairs for the vision model and the pixels they contain."""
+        if not regions:
+            return [(encoded, None)], screenshot.width * screenshot.height
+
+        overview = overview_image(screenshot, self.overview_size)
+        images = [(
+            encode_image(overview, self.image_format, self.image_quality),
+            f"Low-resolution overview of the full {screenshot.width}x{screenshot.height} screen. "
+            f"Only the regions that changed since the previous screenshot follow at full resolution.",
+        )]
+        pixels_sent = overview.width * overview.height
+        for left, top, right, bottom in regions:
+            crop = screenshot.crop((left, top, right, bottom))
+            images.append((
+                encode_image(crop, self.image_format, self.image_quality),
+                f"Changed region at x={left}, y={top}, size {right - left}x{bottom - top}:",
+            ))
+            pixels_sent += crop.width * crop.height
+        return images, pixels_sent
+
+    def _process_batch(self, frames):
+        """Inference stage: runs on a pipeline worker, returns the log entries for each frame."""
+        metrics = self.session.metrics
+        started = time.monotonic()
+        for frame in frames:
+            metrics.observe("stage_queue_wait_seconds", started - frame.queued_at)
+        # The local triage comes first, so frames it marks sensitive never reach a remote model
+        # in any form; without a cascade every frame is headed for the vision model
+        routes = self.cascade.triage_frames(frames) if self.cascade else [("remote", None)] * len(frames)
+        routes = dict(zip((frame.seq for frame in frames), routes))
+        # OCR'd text stands in for the image on text-heavy screens that would go remote
+        text_paths = {}
+        for frame in frames:
+            if routes[frame.seq][0] != "remote":
+                continue
+            text_path = self.session_prompts.describe_from_text(frame.image, frame.window_title, frame.captured_at)
+            if text_path:
+                text_paths[frame.seq] = text_path
+
+        escalated = [frame for frame in frames if routes[frame.seq][0] == "remote" and frame.seq not in text_paths]
+        remote_responses = {}
+        if escalated:
+            with metrics.timer("stage_vision_seconds"):
+                vision_responses = self.session_prompts.describe_screenshots(
+                    [(frame.images, frame.window_title, frame.captured_at) for frame in escalated]
+                )
+            remote_responses = dict(zip((frame.seq for frame in escalated), vision_responses))
+        for frame in frames:
+            metrics.observe("frame_latency_seconds", (datetime.now() - frame.captured_at).total_seconds())
+        model = self.session_prompts.vision.model
+        results = []
+        for frame in frames:
+            entries = [{"message": None, "kind": "capture", "filename": frame.filename, "window": frame.window_title}]
+            if frame.seq in text_paths:
+                description, fields = text_paths[frame.seq]
+                triage = routes[frame.seq][1]
+                if triage:
+                    fields = {**fields, "confidence": triage.confidence, "novelty": triage.novelty, "sensitive": triage.sensitive}
+                if self.cascade and description is not None:
+                    self.cascade.remember(description)
+            else:
+                description, fields = self._image_description(frame, routes[frame.seq][1], remote_responses.get(frame.seq), model)
+            if description is not None:
+                entries.append({"message": f"Active window: {frame.window_title}", "kind": "window", "window": frame.window_title})
+                entries.append({"message": description, "kind": "vision", **fields})
+            results.append(entries)
+        return results
+
+    def _image_description(self, frame, triage, description, model):
+        """Description and log fields for a frame on the image path (local triage and/or remote model)."""
+        fields = {"model": model}
+        if self.session_prompts.ocr:
+            fields["path"] = "image"
+        if self.cascade:
+            fields["tier"] = "remote"
+            if description is not None:
+                self.cascade.remember(description)
+        if triage:
+            fields.update(confidence=triage.confidence, novelty=triage.novelty, sensitive=triage.sensitive)
+            if description is None:
+                # Kept local, or the remote model failed: use the local description
+                description = triage.description
+                fields.update(model=self.cascade.model, tier="local")
+        return description, fields
+
+    def _wait_until(self, deadline):
+        """Sleep until deadline, waking early on pause, resume or stop.
+
+        Returns False once stopped. While paused this blocks without a timeout, and a resume
+        restarts the schedule and returns early so the caller recomputes its deadline.
+        """
+        with self._state_changed:
+            while not self.stopped:
+                if self.paused:
+                    while self.paused and not self.stopped:
+                        self._state_changed.wait()
+                    self.scheduler.reset(time.monotonic())
+                    return not self.stopped
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._state_changed.wait(remaining)
+            return False
 
     def capture_loop(self):
+        self.scheduler.reset(time.monotonic())
+        last_window = self.backend.active_window().id if self.window_poll_interval else None
+        budget_warned = False
         while True:
-            time.sleep(self.interval)
-            if not self.paused:
-                self.capture_screen()
+            now = time.monotonic()
+            due = self.scheduler.next_capture_at(now)
+            if self.scheduler.budget_exhausted(now):
+                if not budget_warned:
+                    self.console.print("[yellow]Hourly capture budget reached, waiting before the next capture[/]")
+                    self.session.metrics.increment("capture_budget_exhausted")
+                    budget_warned = True
+            else:
+                budget_warned = False
+            wake = min(due, now + self.window_poll_interval) if self.window_poll_interval else due
+            if not self._wait_until(wake):
+                return
+
+            now = time.monotonic()
+            window, window_switched = None, False
+            if self.window_poll_interval:
+                window = self.backend.active_window()
+                window_switched = window.id != last_window
+                last_window = window.id
+            if now < due and not (window_switched and self.scheduler.can_capture_early(now)):
+                continue
+
+            if window_switched:
+                self.session.metrics.increment("captures_on_window_switch")
+            try:
+                outcome = self.capture_screen(window)
+            except ReplayFinished as e:
+                self.console.print(f"[yellow]{e}[/]")
+                return
+            except Exception as e:
+                self.logger.error(f"Capture failed: {e}", exc_info=True)
+                self.session.metrics.increment("capture_errors")
+                outcome = "skipped"
+            interval = self.scheduler.record(outcome, now)
+            if outcome != "skipped":
+                self.session.metrics.observe("capture_interval", interval)
 
     def start(self):
-        self.capture_thread = threading.Thread(target=self.capture_loop)
+        self.pipeline.start()
+        self.capture_thread = threading.Thread(target=self.capture_loop, name="capture")
         self.capture_thread.daemon = True
         self.capture_thread.start()
 
-    def stop(self):
-        self.capture_thread.join()
+    def stop(self, timeout=None):
+        """Stop capturing and let the inference workers finish the frames already queued."""
+        self._set_state(stopped=True)
+        if self.capture_thread and self.capture_thread is not threading.current_thread():
+            self.capture_thread.join(timeout)
+        self.pipeline.stop(timeout)
+        self.store.close()
 
     def pause(self):
-        self.paused = True
+        self._set_state(paused=True)
 
     def resume(self):
-        self.paused = False 
\ No newline at end of file
+        self._set_state(paused=False)
+
+    def _set_state(self, **state):
+        with self._state_changed:
+            for name, value in state.items():
+                setattr(self, name, value)
+            self._state_changed.notify_all()
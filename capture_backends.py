@@ -0,0 +1,441 @@
+"""Screen capture backends: frame grab, active window info and window bounds.
+
+- pyautogui: the portable default. Window info comes from win32gui on Windows and a
+  one-off osascript call on macOS.
+- x11: mss (XShm) grabs and python-xlib window queries over one persistent connection.
+  Works under Xvfb.
+- macos: a long-lived JXA helper process answers window queries over a pipe instead of
+  forking osascript per call. Frames are grabbed with mss if installed.
+- replay: feeds recorded frames from a directory, for deterministic runs and benchmarks.
+
+Backends are selected with the `capture_backend` config key (`auto` by default).
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import threading
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+REPLAY_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+class WindowInfo(NamedTuple):
+    id: str
+    title: str
+    # (left, top, width, height) in the platform's screen coordinates (points on macOS), when reported
+    bounds: Optional[tuple] = None
+
+
+def window_box(bounds, padding=0):
+    """(left, top, right, bottom) of a window's (left, top, width, height) bounds, grown by padding."""
+    left, top, width, height = bounds
+    return (left - padding, top - padding, left + width + padding, top + height + padding)
+
+
+def clip_box(box, limits):
+    """Intersect two (left, top, right, bottom) boxes. Returns None if they don't overlap."""
+    left, top = max(box[0], limits[0]), max(box[1], limits[1])
+    right, bottom = min(box[2], limits[2]), min(box[3], limits[3])
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right, bottom)
+
+
+class ReplayFinished(Exception):
+    """Raised by the replay backend when it runs out of frames."""
+
+
+class CaptureBackend:
+    name = "base"
+    # False for backends that don't show the live screen (the app's own window is never captured)
+    interactive = True
+
+    def grab(self):
+        """Return the full screen as a PIL image."""
+        raise NotImplementedError
+
+    def grab_region(self, box):
+        """Return the (left, top, right, bottom) part of the screen, clipped to the screen.
+
+        box is in window-bounds coordinates. Backends that can grab just that area override
+        this; the default crops a full grab.
+        """
+        screen = self.grab()
+        return screen.crop(self.image_box(box, screen.size))
+
+    def screen_bounds(self):
+        """(left, top, width, height) of what grab() returns, in window-bounds coordinates.
+
+        None means window bounds are already pixel offsets into the grabbed image.
+        """
+        return None
+
+    def image_box(self, box, image_size):
+        """Map a box in window-bounds coordinates to pixels of a full grab of image_size, clipped to it.
+
+        Accounts for a virtual screen whose origin isn't (0, 0) (monitors left of or above
+        the primary) and for grabs in physical pixels of a screen measured in points (Retina).
+        """
+        limits = (0, 0, *image_size)
+        screen = self.screen_bounds()
+        if screen:
+            left, top, width, height = screen
+            scale_x, scale_y = image_size[0] / width, image_size[1] / height
+            box = (round((box[0] - left) * scale_x), round((box[1] - top) * scale_y),
+                   round((box[2] - left) * scale_x), round((box[3] - top) * scale_y))
+        return clip_box(box, limits) or limits
+
+    def active_window(self):
+        """Return a WindowInfo for the focused window."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PyAutoGUIBackend(CaptureBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+        self.system = platform.system()
+
+    def grab(self):
+        return self._pyautogui.screenshot()
+
+    def grab_region(self, box):
+        if self.system == "Darwin":
+            # Screenshots are in physical pixels but the screen size is in points
+            return super().grab_region(box)
+        width, height = self._pyautogui.size()
+        left, top, right, bottom = clip_box(box, (0, 0, width, height)) or (0, 0, width, height)
+        return self._pyautogui.screenshot(region=(left, top, right - left, bottom - top))
+
+    def screen_bounds(self):
+        return (0, 0, *self._pyautogui.size())
+
+    def active_window(self):
+        if self.system == "Darwin":
+            return self._macos_window()
+        if self.system == "Windows":
+            return self._windows_window()
+        return WindowInfo(f"unsupported_os_{self.system}", f"Unsupported OS: {self.system}")
+
+    def _macos_window(self):
+        script = '''
+        tell application "System Events"
+            set frontApp to name of first application process whose frontmost is true
+            set windowTitle to ""
+            tell process frontApp
+                if exists (1st window whose value of attribute "AXMain" is true) then
+                    set windowTitle to name of 1st window whose value of attribute "AXMain" is true
+                end if
+            end tell
+            return {frontApp, windowTitle}
+        end tell
+        '''
+        try:
+            result = subprocess.run(["osascript", "-e", script], capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError:
+            return WindowInfo("unknown", "Unknown")
+        except Exception as e:
+            return WindowInfo("error", f"Error: {str(e)}")
+        output = result.stdout.strip().split(", ", 1)
+        app_name = output[0]
+        window_title = output[1] if len(output) > 1 else ""
+        title = f"{app_name}: {window_title}" if window_title else app_name
+        return WindowInfo(title, title)
+
+    def _windows_window(self):
+        try:
+            import win32gui
+        except ImportError:
+            return WindowInfo("win32gui_not_installed", "win32gui not installed")
+        try:
+            hwnd = win32gui.GetForegroundWindow()
+            left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+            return WindowInfo(str(hwnd), win32gui.GetWindowText(hwnd), (left, top, right - left, bottom - top))
+        except Exception:
+            return WindowInfo("unknown", "Unknown")
+
+
+class _MSSGrabber:
+    """Per-thread mss instances (mss handles must not be shared across threads)."""
+
+    def __init__(self):
+        import mss
+        self._mss = mss
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        return sct
+
+    def grab(self, monitor_index=0):
+        sct = self._sct()
+        shot = sct.grab(sct.monitors[monitor_index])
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def screen_bounds(self):
+        """(left, top, width, height) of the virtual screen spanning all monitors."""
+        screen = self._sct().monitors[0]
+        return (screen["left"], screen["top"], screen["width"], screen["height"])
+
+    def grab_region(self, box):
+        """Grab only box (screen coordinates), clipped to the virtual screen."""
+        sct = self._sct()
+        screen = sct.monitors[0]
+        limits = (screen["left"], screen["top"], screen["left"] + screen["width"], screen["top"] + screen["height"])
+        left, top, right, bottom = clip_box(box, limits) or limits
+        shot = sct.grab({"left": left, "top": top, "width": right - left, "height": bottom - top})
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+
+class X11Backend(CaptureBackend):
+    """mss/XShm grabs and EWMH window queries. Needs the optional mss and python-xlib packages."""
+
+    name = "x11"
+
+    def __init__(self, display=None):
+        from Xlib import X, display as xdisplay, error as xerror
+        self._X = X
+        self._xerror = xerror
+        self._grabber = _MSSGrabber()
+        self._display = xdisplay.Display(display)
+        self._root = self._display.screen().root
+        self._atoms = {name: self._display.intern_atom(name) for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "UTF8_STRING")}
+        # python-xlib connections are not thread-safe
+        self._lock = threading.Lock()
+
+    def grab(self):
+        return self._grabber.grab()
+
+    def grab_region(self, box):
+        return self._grabber.grab_region(box)
+
+    def screen_bounds(self):
+        return self._grabber.screen_bounds()
+
+    def active_window(self):
+        with self._lock:
+            try:
+                prop = self._root.get_full_property(self._atoms["_NET_ACTIVE_WINDOW"], self._X.AnyPropertyType)
+                window_id = prop.value[0] if prop and len(prop.value) else 0
+                if not window_id:
+                    return WindowInfo("0", "Desktop")
+                window = self._display.create_resource_object("window", window_id)
+                name = window.get_full_property(self._atoms["_NET_WM_NAME"], self._atoms["UTF8_STRING"])
+                window_title = name.value.decode("utf-8", "replace") if name else (window.get_wm_name() or "")
+                wm_class = window.get_wm_class()
+                app_name = wm_class[1] if wm_class else ""
+                geometry = window.get_geometry()
+                origin = window.translate_coords(self._root, 0, 0)
+                bounds = (-origin.x, -origin.y, geometry.width, geometry.height)
+            except self._xerror.XError as e:
+                logging.getLogger('X11Backend').debug(f"Window query failed: {e}")
+                return WindowInfo("unknown", "Unknown")
+        title = f"{app_name}: {window_title}" if app_name and window_title else (app_name or window_title)
+        return WindowInfo(hex(window_id), title, bounds)
+
+    def close(self):
+        with self._lock:
+            self._display.close()
+
+
+MACOS_HELPER_SCRIPT = r"""
+ObjC.import('Foundation');
+function run() {
+    const systemEvents = Application('System Events');
+    const stdin = $.NSFileHandle.fileHandleWithStandardInput;
+    const stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+    while (true) {
+        if (stdin.availableData.length === 0) break;
+        let reply;
+        try {
+            const proc = systemEvents.applicationProcesses.whose({frontmost: true})[0];
+            reply = {app: proc.name(), title: '', bounds: null};
+            if (proc.windows.length > 0) {
+                const window = proc.windows[0];
+                const position = window.position();
+                const size = window.size();
+                reply.title = window.name() || '';
+                reply.bounds = [position[0], position[1], size[0], size[1]];
+            }
+        } catch (e) {
+            reply = {error: String(e)};
+        }
+        stdout.writeData($(JSON.stringify(reply) + '\n').dataUsingEncoding($.NSUTF8StringEncoding));
+    }
+}
+"""
+
+
+class MacOSBackend(CaptureBackend):
+    """Keeps one osascript (JXA) helper alive and asks it for the front window per call."""
+
+    name = "macos"
+
+    def __init__(self):
+        self.logger = logging.getLogger('MacOSBackend')
+        self._lock = threading.Lock()
+        self._helper = None
+        try:
+            self._grabber = _MSSGrabber()
+        except ImportError:
+            import pyautogui
+            self._grabber = None
+            self._pyautogui = pyautogui
+
+    def grab(self):
+        if self._grabber:
+            return self._grabber.grab()
+        return self._pyautogui.screenshot()
+
+    def grab_region(self, box):
+        if self._grabber:
+            return self._grabber.grab_region(box)
+        return super().grab_region(box)
+
+    def screen_bounds(self):
+        # Window bounds from System Events are in points; grabs are in pixels
+        if self._grabber:
+            return self._grabber.screen_bounds()
+        return (0, 0, *self._pyautogui.size())
+
+    def _start_helper(self):
+        self._helper = subprocess.Popen(
+            ["osascript", "-l", "JavaScript", "-e", MACOS_HELPER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+        )
+
+    def active_window(self):
+        with self._lock:
+            for attempt in range(2):
+                if self._helper is None or self._helper.poll() is not None:
+                    self._start_helper()
+                try:
+                    self._helper.stdin.write("window\n")
+                    self._helper.stdin.flush()
+                    line = self._helper.stdout.readline()
+                    if line:
+                        break
+                except OSError as e:
+                    self.logger.warning(f"Window helper failed: {e}")
+                # The helper died; restart it once
+                self._helper = None
+            else:
+                return WindowInfo("unknown", "Unknown")
+        reply = json.loads(line)
+        if "error" in reply:
+            return WindowInfo("error", f"Error: {reply['error']}")
+        title = f"{reply['app']}: {reply['title']}" if reply["title"] else reply["app"]
+        bounds = tuple(reply["bounds"]) if reply.get("bounds") else None
+        return WindowInfo(title, title, bounds)
+
+    def close(self):
+        with self._lock:
+            if self._helper and self._helper.poll() is None:
+                self._helper.stdin.close()
+                self._helper.wait(timeout=2)
+            self._helper = None
+
+
+class ReplayBackend(CaptureBackend):
+    """Replays image files from a directory in name order.
+
+    An optional `windows.json` in the directory maps file names to {"title", "bounds"}.
+    Frames without an entry report the file name as the window title.
+    """
+
+    name = "replay"
+    interactive = False
+
+    def __init__(self, directory, loop=False):
+        self.directory = directory
+        self.loop = loop
+        self.files = sorted(f for f in os.listdir(directory) if f.lower().endswith(REPLAY_EXTENSIONS))
+        if not self.files:
+            raise ValueError(f"No frames to replay in {directory}")
+        try:
+            with open(os.path.join(directory, "windows.json"), "r") as f:
+                self.windows = json.load(f)
+        except (OSError, ValueError):
+            self.windows = {}
+        self.position = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current_file(self):
+        return self.files[min(self.position, len(self.files) - 1)]
+
+    def grab(self):
+        with self._lock:
+            if self.position >= len(self.files):
+                if not self.loop:
+                    raise ReplayFinished(f"Replayed all {len(self.files)} frames from {self.directory}")
+                self.position = 0
+            filename = self.files[self.position]
+            self.position += 1
+        with Image.open(os.path.join(self.directory, filename)) as image:
+            return image.convert("RGB")
+
+    def active_window(self):
+        # Describes the frame the next grab() returns
+        with self._lock:
+            filename = self.files[self.position % len(self.files)]
+        window = self.windows.get(filename, {})
+        title = window.get("title", f"Replay: {filename}")
+        bounds = tuple(window["bounds"]) if window.get("bounds") else None
+        return WindowInfo(title, title, bounds)
+
+
+def _auto_backend():
+    system = platform.system()
+    if system == "Darwin":
+        return MacOSBackend()
+    if system == "Linux" and os.environ.get("DISPLAY"):
+        try:
+            return X11Backend()
+        except Exception as e:
+            logging.getLogger('capture_backends').info(f"X11 backend unavailable ({e}), using pyautogui")
+    return PyAutoGUIBackend()
+
+
+def create_backend(config):
+    name = config.get("capture_backend", "auto")
+    if name == "auto":
+        return _auto_backend()
+    if name == "pyautogui":
+        return PyAutoGUIBackend()
+    if name == "x11":
+        return X11Backend(config.get("capture_display"))
+    if name == "macos":
+        return MacOSBackend()
+    if name == "replay":
+        return ReplayBackend(config["capture_replay_dir"], loop=config.get("capture_replay_loop", False))
+    raise ValueError(f"Unknown capture backend: {name}")
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_capture_backend(config=None):
+    """Return the shared backend for this configuration, creating it on first use.
+
+    Sharing keeps helper processes and display connections alive across sessions.
+    """
+    config = config or {}
+    key = tuple(config.get(name) for name in ("capture_backend", "capture_replay_dir", "capture_replay_loop", "capture_display"))
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _backends[key] = create_backend(config)
+        return backend
@@ -0,0 +1,105 @@
+from collections import deque
+
+CAPTURE_OUTCOMES = ("changed", "unchanged", "skipped")
+
+
+class CaptureScheduler:
+    """Decides when the next screenshot is due based on recent activity.
+
+    The interval starts at base_interval. Each capture that shows no change (a static
+    screen, usually an idle user) multiplies it by backoff_factor up to max_interval. While
+    at least high_change_rate of the last change_window captures showed changes it is
+    divided by backoff_factor down to min_interval. Otherwise a change moves it back to
+    base_interval. A window switch allows an immediate capture, at least min_interval after
+    the previous one. hourly_budget caps the captures taken in any rolling hour.
+
+    Times are time.monotonic() values supplied by the caller.
+    """
+
+    def __init__(self, base_interval=15, min_interval=None, max_interval=None, backoff_factor=2.0,
+                 hourly_budget=None, change_window=5, high_change_rate=0.8):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval if min_interval is not None else base_interval, base_interval)
+        self.max_interval = max(max_interval if max_interval is not None else base_interval, base_interval)
+        self.backoff_factor = max(backoff_factor, 1.0)
+        self.hourly_budget = hourly_budget
+        self.high_change_rate = high_change_rate
+        self.interval = base_interval
+        self.started_at = 0.0
+        self.last_capture = None
+        self._recent_changes = deque(maxlen=max(change_window, 1))
+        self._capture_times = deque()
+
+    @classmethod
+    def from_config(cls, config):
+        """Without the capture_min/max_interval keys this keeps a fixed capture_interval."""
+        interval = config.get("capture_interval", 15)
+        return cls(
+            base_interval=interval,
+            min_interval=config.get("capture_min_interval", interval),
+            max_interval=config.get("capture_max_interval", interval),
+            backoff_factor=config.get("capture_backoff_factor", 2.0),
+            hourly_budget=config.get("capture_hourly_budget"),
+            change_window=config.get("capture_change_window", 5),
+            high_change_rate=config.get("capture_high_change_rate", 0.8),
+        )
+
+    def reset(self, now):
+        """Start a fresh schedule (on start and resume). The hourly budget carries over."""
+        self.interval = self.base_interval
+        self.started_at = now
+        self.last_capture = None
+        self._recent_changes.clear()
+
+    def scale(self, factor):
+        """Stretch (factor > 1) or shrink every interval, e.g. to stay within a token budget."""
+        self.base_interval *= factor
+        self.min_interval *= factor
+        self.max_interval *= factor
+        self.interval *= factor
+
+    def next_capture_at(self, now):
+        due = (self.last_capture if self.last_capture is not None else self.started_at) + self.interval
+        if self.budget_exhausted(now):
+            due = max(due, self._capture_times[0] + 3600)
+        return due
+
+    def can_capture_early(self, now):
+        """Whether a window switch may trigger a capture right now."""
+        if self.budget_exhausted(now):
+            return False
+        return self.last_capture is None or now - self.last_capture >= self.min_interval
+
+    def budget_exhausted(self, now):
+        if not self.hourly_budget:
+            return False
+        while self._capture_times and self._capture_times[0] <= now - 3600:
+            self._capture_times.popleft()
+        return len(self._capture_times) >= self.hourly_budget
+
+    def record(self, outcome, now):
+        """Update the schedule after a capture attempt and return the new interval."""
+        if outcome not in CAPTURE_OUTCOMES:
+            raise ValueError(f"Unknown capture outcome: {outcome}")
+        self.last_capture = now
+        if outcome == "skipped":
+            # Nothing was captured (e.g. still in the starting window), keep the current pace
+            return self.interval
+        self._capture_times.append(now)
+        changed = outcome == "changed"
+        self._recent_changes.append(changed)
+
+        if not changed:
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+        elif self._change_rate() >= self.high_change_rate:
+            self.interval = max(self.interval / self.backoff_factor, self.min_interval)
+        elif self.interval >= self.base_interval:
+            self.interval = self.base_interval
+        else:
+            self.interval = min(self.interval * self.backoff_factor, self.base_interval)
+        return self.interval
+
+    def _change_rate(self):
+        if len(self._recent_changes) < self._recent_changes.maxlen:
+            return 0.0
+        return sum(self._recent_changes) / len(self._recent_changes)
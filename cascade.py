@@ -0,0 +1,110 @@
+import logging
+import threading
+from typing import NamedTuple
+
+
+class Triage(NamedTuple):
+    description: str
+    confidence: float
+    novelty: float
+    sensitive: bool
+    reason: str = ""
+
+
+def _score(value):
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+class VisionCascade:
+    """Describes each frame with the local privacy_vision_model before the remote model.
+
+    The local model returns a short description, a confidence and a novelty score, and a
+    sensitive verdict. Frames are then routed:
+    - private: marked sensitive, never sent to screen_vision_model; the local description is logged
+    - remote: novelty of at least novelty_threshold or confidence below confidence_threshold
+    - local: everything else keeps the local description
+    If the local model fails, the frame goes to the remote model unless escalate_on_error is False,
+    in which case it is logged without a description.
+    """
+
+    def __init__(self, session, confidence_threshold=0.7, novelty_threshold=0.5, escalate_on_error=True):
+        self.session = session
+        self.confidence_threshold = confidence_threshold
+        self.novelty_threshold = novelty_threshold
+        self.escalate_on_error = escalate_on_error
+        self.logger = logging.getLogger('VisionCascade')
+        self._lock = threading.Lock()
+        # Latest description, given to the local model as the baseline for novelty
+        self._previous = None
+
+    @classmethod
+    def from_config(cls, session):
+        """Returns None unless `vision_cascade` is enabled."""
+        config = session.config
+        if not config.get("vision_cascade"):
+            return None
+        return cls(
+            session,
+            confidence_threshold=config.get("cascade_confidence_threshold", 0.7),
+            novelty_threshold=config.get("cascade_novelty_threshold", 0.5),
+            escalate_on_error=config.get("cascade_escalate_on_error", True),
+        )
+
+    @property
+    def model(self):
+        return self.session.prompts.privacy_vision.model
+
+    def triage(self, frame):
+        """Ask the local model about one frame. Returns a Triage, or None on failure."""
+        with self._lock:
+            previous = self._previous
+        verdict = self.session.prompts.triage_screenshot(frame.images, frame.window_title, frame.captured_at, previous)
+        if verdict is None or not verdict.get("description"):
+            return None
+        triage = Triage(
+            description=str(verdict["description"]),
+            confidence=_score(verdict.get("confidence")),
+            novelty=_score(verdict.get("novelty", 1.0)),
+            sensitive=_flag(verdict.get("sensitive")),
+            reason=str(verdict.get("reason") or ""),
+        )
+        self.remember(triage.description)
+        return triage
+
+    def route(self, triage):
+        if triage is None:
+            return "remote" if self.escalate_on_error else "local"
+        if triage.sensitive:
+            return "private"
+        if triage.novelty >= self.novelty_threshold or triage.confidence < self.confidence_threshold:
+            return "remote"
+        return "local"
+
+    def triage_frames(self, frames):
+        """Return a (route, triage) pair per frame, in order."""
+        metrics = self.session.metrics
+        results = []
+        for frame in frames:
+            with metrics.timer("stage_local_vision_seconds"):
+                triage = self.triage(frame)
+            route = self.route(triage)
+            if triage is None:
+                metrics.increment("cascade_errors")
+            metrics.increment(f"cascade_{route}")
+            if route == "private":
+                self.logger.info(f"Keeping screenshot {frame.filename} local: {triage.reason or 'sensitive'}")
+            results.append((route, triage))
+        return results
+
+    def remember(self, description):
+        with self._lock:
+            self._previous = description
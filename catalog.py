@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from screenshot_store import ScreenshotStore
+from trace_log import TraceLog
+
+OBJECTIVE_PREFIX = "USER'S STATED CURRENT OBJECTIVE: "
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    parent_session_id TEXT,
+    created_at TEXT NOT NULL,
+    last_activity_at TEXT,
+    closed_at TEXT,
+    objective TEXT,
+    frame_count INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    models TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS sessions_created_at ON sessions (created_at);
+"""
+
+
+class SessionCatalog:
+    """SQLite index of the sessions in sessions_dir and their per-session metadata.
+
+    It is updated as sessions are created, captured into and closed. If the database is
+    missing or unreadable it is rebuilt from the session directories.
+    """
+
+    def __init__(self, sessions_dir):
+        self.sessions_dir = sessions_dir
+        self.path = os.path.join(sessions_dir, "catalog.sqlite")
+        self.logger = logging.getLogger('SessionCatalog')
+        self._lock = threading.Lock()
+        needs_rebuild = not os.path.exists(self.path)
+        self._db = None
+        try:
+            self._db = self._connect()
+            self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        except sqlite3.DatabaseError as e:
+            self.logger.warning(f"Session catalog unreadable ({e}), rebuilding")
+            if self._db:
+                self._db.close()
+            os.remove(self.path)
+            self._db = self._connect()
+            needs_rebuild = True
+        if needs_rebuild:
+            self.rebuild()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.executescript(SCHEMA)
+        return db
+
+    def create(self, session_id, parent_session_id=None, created_at=None):
+        created_at = (created_at or datetime.now()).isoformat(timespec='seconds')
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, parent_session_id, created_at, last_activity_at) VALUES (?, ?, ?, ?)",
+                (session_id, parent_session_id, created_at, created_at),
+            )
+
+    def record_capture(self, session_id, nbytes, model=None):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._db:
+            row = self._db.execute("SELECT models FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return
+            models = json.loads(row["models"])
+            if model and model not in models:
+                models.append(model)
+            self._db.execute(
+                "UPDATE sessions SET frame_count = frame_count + 1, bytes = bytes + ?, last_activity_at = ?, models = ? WHERE session_id = ?",
+                (nbytes, now, json.dumps(models), session_id),
+            )
+
+    def set_objective(self, session_id, objective):
+        with self._lock, self._db:
+            self._db.execute("UPDATE sessions SET objective = ? WHERE session_id = ?", (objective, session_id))
+
+    def close(self, session_id, closed_at=None):
+        closed_at = (closed_at or datetime.now()).isoformat(timespec='seconds')
+        with self._lock, self._db:
+            self._db.execute("UPDATE sessions SET closed_at = ? WHERE session_id = ?", (closed_at, session_id))
+
+    def most_recent(self):
+        """ID of the most recently created session, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT session_id FROM sessions ORDER BY created_at DESC, session_id DESC LIMIT 1").fetchone()
+        return row["session_id"] if row else None
+
+    def list_sessions(self, limit=20, since=None, model=None, objective=None):
+        """Most recent sessions first, optionally filtered by creation time, model used or objective text."""
+        query = "SELECT * FROM sessions WHERE 1 = 1"
+        params = []
+        if since:
+            query += " AND created_at >= ?"
+            params.append(since.isoformat(timespec='seconds'))
+        if model:
+            query += " AND EXISTS (SELECT 1 FROM json_each(models) WHERE value = ?)"
+            params.append(model)
+        if objective:
+            query += " AND objective LIKE ?"
+            params.append(f"%{objective}%")
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def stats(self):
+        """Aggregate counts across all sessions."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) AS sessions, COALESCE(SUM(frame_count), 0) AS frames, COALESCE(SUM(bytes), 0) AS bytes,"
+                " COALESCE(SUM(strftime('%s', COALESCE(closed_at, last_activity_at)) - strftime('%s', created_at)), 0) AS seconds"
+                " FROM sessions"
+            ).fetchone()
+        return dict(row)
+
+    def _row_to_dict(self, row):
+        session = dict(row)
+        session["models"] = json.loads(session["models"])
+        end = session["closed_at"] or session["last_activity_at"]
+        session["duration_seconds"] = (
+            (datetime.fromisoformat(end) - datetime.fromisoformat(session["created_at"])).total_seconds() if end else 0
+        )
+        return session
+
+    def rebuild(self):
+        """Recreate the catalog from the session directories on disk."""
+        self.logger.info(f"Rebuilding session catalog from {self.sessions_dir}")
+        rows = []
+        for session_id in sorted(os.listdir(self.sessions_dir)):
+            session_dir = os.path.join(self.sessions_dir, session_id)
+            if os.path.isdir(session_dir):
+                rows.append(self._scan_session(session_id, session_dir))
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sessions")
+            self._db.executemany(
+                "INSERT INTO sessions (session_id, parent_session_id, created_at, last_activity_at, closed_at, objective, frame_count, bytes, models)"
+                " VALUES (:session_id, :parent_session_id, :created_at, :last_activity_at, :closed_at, :objective, :frame_count, :bytes, :models)",
+                rows,
+            )
+
+    def _scan_session(self, session_id, session_dir):
+        try:
+            with open(os.path.join(session_dir, "session.json"), "r") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = {}
+        try:
+            created_at = metadata.get("created_at") or datetime.strptime(session_id, "%Y%m%d_%H%M%S").isoformat()
+        except ValueError:
+            created_at = datetime.fromtimestamp(os.path.getctime(session_dir)).isoformat(timespec='seconds')
+
+        frame_count, nbytes = ScreenshotStore.scan(os.path.join(session_dir, "screenshots"))
+
+        models, objective, last_activity_at = [], None, None
+        log_filepath = os.path.join(session_dir, "trace_log.txt")
+        if os.path.exists(log_filepath):
+            for record in TraceLog(log_filepath).records():
+                last_activity_at = datetime.fromtimestamp(record["ts"]).isoformat(timespec='seconds')
+                if record.get("model") and record["model"] not in models:
+                    models.append(record["model"])
+                if record.get("message", "").startswith(OBJECTIVE_PREFIX):
+                    objective = record["message"][len(OBJECTIVE_PREFIX):]
+
+        return {
+            "session_id": session_id,
+            "parent_session_id": metadata.get("parent_session_id"),
+            "created_at": created_at,
+            "last_activity_at": last_activity_at or created_at,
+            # A session found on disk is no longer being written to
+            "closed_at": last_activity_at or created_at,
+            "objective": objective,
+            "frame_count": frame_count,
+            "bytes": nbytes,
+            "models": json.dumps(models),
+        }
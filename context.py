@@ -1,10 +1,24 @@
 import os
+import re
 import git
+import time
+import fnmatch
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict, List, Optional, Set
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict
 import json
 
+# Directories never descended into by add_directory
+PRUNED_DIRS = {".git", "node_modules"}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+NGRAM = 3
+# Candidate sets this small are checked by substring rather than narrowed further
+CANDIDATE_CHECK_LIMIT = 256
+
 @dataclass
 class ContextItem:
     type: str
@@ -13,13 +27,247 @@ class ContextItem:
     priority: int = 0
     last_accessed: float = 0.0
 
+class GitIgnore:
+    """Matches paths against the .gitignore files found while walking a tree.
+
+    Supports comments, negation (!), directory-only (trailing /) and anchored patterns
+    (a leading or inner /). Rules from deeper .gitignore files are checked last so they win.
+    """
+
+    def __init__(self):
+        self.rules = []  # (base dir, pattern, negated, dir_only, anchored)
+
+    def add_file(self, gitignore_path: str) -> None:
+        base = os.path.dirname(gitignore_path)
+        try:
+            with open(gitignore_path, 'r', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.strip('/') if dir_only else line
+            anchored = '/' in line
+            self.rules.append((base, line.lstrip('/'), negated, dir_only, anchored))
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        result = False
+        for base, pattern, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if not path.startswith(base + os.sep):
+                continue
+            relative = path[len(base) + 1:].replace(os.sep, '/')
+            target = relative if anchored else relative.rsplit('/', 1)[-1]
+            if fnmatch.fnmatchcase(target, pattern):
+                result = not negated
+        return result
+
+
+class ContextIndex:
+    """Indexes over context items for get_relevant_context.
+
+    Ordering: by priority, then last_accessed, then the order paths were first added, which
+    is what a stable sort of the items in insertion order gives. Re-adding a path keeps its
+    place among equal access times, as reassigning a dict key does. One OrderedDict per
+    priority holds paths from last to first in that order, so the top k are read from the
+    highest priority group backwards in O(k) and a read moves an item to the end in O(1).
+
+    Search: each item's path and metadata values are split into lowercase alphanumeric
+    tokens with an inverted index from token to paths, and the token vocabulary is indexed
+    by trigram. Every token of a query must occur inside some token of a matching item, so
+    candidates come from the postings of the vocabulary tokens containing each query token.
+    They are then checked with the same substring match as a full scan.
+    """
+
+    def __init__(self):
+        self._groups: Dict[int, OrderedDict] = {}
+        self._priorities: List[int] = []  # descending
+        self._entries: Dict[str, tuple] = {}  # path -> (priority, last_accessed, sequence)
+        self._sequence = 0  # incremented for each new path
+        self._unsorted: Set[int] = set()  # priorities whose group needs sorting before the next read
+        self._texts: Dict[str, List[str]] = {}  # path -> lowercased path and metadata values
+        self._token_paths: Dict[str, Set[str]] = {}
+        self._ngram_tokens: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def build(cls, items) -> "ContextIndex":
+        """Index items at once. Ties in last_accessed keep the given order."""
+        index = cls()
+        for item in items:
+            index.add(item)
+        return index
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, path: str) -> tuple:
+        """Sort key within a priority group, ascending from the last item to the first."""
+        _, last_accessed, sequence = self._entries[path]
+        return last_accessed, -sequence
+
+    def add(self, item: ContextItem) -> None:
+        """Index an item, or update it in place if its path is already indexed."""
+        if item.path in self._entries:
+            sequence = self._entries[item.path][2]
+            self.remove(item.path)
+        else:
+            self._sequence += 1
+            sequence = self._sequence
+        group = self._groups.get(item.priority)
+        if group is None:
+            group = self._groups[item.priority] = OrderedDict()
+            self._priorities = sorted(self._groups, reverse=True)
+        key = (item.last_accessed, -sequence)
+        if not group or item.priority in self._unsorted or key > self._key(next(reversed(group))):
+            group[item.path] = None
+        elif key < self._key(next(iter(group))):
+            # Comes after everything in the group (e.g. never accessed)
+            group[item.path] = None
+            group.move_to_end(item.path, last=False)
+        else:
+            # Sorted into place before the next read
+            group[item.path] = None
+            self._unsorted.add(item.priority)
+        self._entries[item.path] = (item.priority, item.last_accessed, sequence)
+
+        texts = [item.path.lower()] + [str(value).lower() for value in item.metadata.values()]
+        self._texts[item.path] = texts
+        for token in {token for text in texts for token in _TOKEN_PATTERN.findall(text)}:
+            paths = self._token_paths.get(token)
+            if paths is None:
+                paths = self._token_paths[token] = set()
+                for start in range(len(token) - NGRAM + 1):
+                    self._ngram_tokens.setdefault(token[start:start + NGRAM], set()).add(token)
+            paths.add(item.path)
+
+    def _sort_pending(self) -> None:
+        for priority in self._unsorted:
+            group = self._groups.get(priority)
+            if not group:
+                continue
+            ordered = sorted(group, key=self._key)
+            group.clear()
+            group.update(dict.fromkeys(ordered))
+        self._unsorted.clear()
+
+    def remove(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        group = self._groups[entry[0]]
+        del group[path]
+        if not group:
+            del self._groups[entry[0]]
+            self._priorities = sorted(self._groups, reverse=True)
+        for token in {token for text in self._texts.pop(path) for token in _TOKEN_PATTERN.findall(text)}:
+            paths = self._token_paths[token]
+            paths.discard(path)
+            if not paths:
+                del self._token_paths[token]
+                for start in range(len(token) - NGRAM + 1):
+                    tokens = self._ngram_tokens[token[start:start + NGRAM]]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._ngram_tokens[token[start:start + NGRAM]]
+
+    def touch(self, paths: List[str], last_accessed: float) -> None:
+        """Record a read of paths at last_accessed, normally making them the most recently accessed."""
+        self._sort_pending()
+        for path in paths:
+            priority, _, sequence = self._entries[path]
+            self._entries[path] = (priority, last_accessed, sequence)
+        for priority in {self._entries[path][0] for path in paths}:
+            group = self._groups[priority]
+            # Paths read at the same time, touched now or already at the end, go last in key order
+            tied = {path for path in paths if self._entries[path][0] == priority}
+            for path in reversed(group):
+                if self._entries[path][1] != last_accessed:
+                    break
+                tied.add(path)
+            ordered = sorted(tied, key=self._key)
+            for path in ordered:
+                group.move_to_end(path)
+            if len(group) > len(ordered):
+                before = next(path for index, path in enumerate(reversed(group)) if index == len(ordered))
+                if self._key(before) > self._key(ordered[0]):
+                    # The clock went back: an untouched item was read later
+                    self._unsorted.add(priority)
+
+    def _tokens_containing(self, fragment: str) -> Set[str]:
+        grams = sorted((self._ngram_tokens.get(fragment[start:start + NGRAM], set())
+                        for start in range(len(fragment) - NGRAM + 1)), key=len)
+        tokens = set(grams[0]).intersection(*grams[1:])
+        return {token for token in tokens if fragment in token}
+
+    def _candidates(self, query: str) -> Optional[Set[str]]:
+        """Paths that may contain query, or None if the query has no fragment long enough to look up.
+
+        Fragments shorter than NGRAM are left to the substring check, as is everything once
+        the candidates are few enough to check directly.
+        """
+        candidates = None
+        for fragment in sorted(set(_TOKEN_PATTERN.findall(query)), key=len, reverse=True):
+            if len(fragment) < NGRAM or (candidates is not None and len(candidates) <= CANDIDATE_CHECK_LIMIT):
+                break
+            paths = set()
+            for token in self._tokens_containing(fragment):
+                paths.update(self._token_paths[token])
+            candidates = paths if candidates is None else candidates & paths
+            if not candidates:
+                return candidates
+        return candidates
+
+    def _ordered(self):
+        for priority in self._priorities:
+            yield from reversed(self._groups[priority])
+
+    def top(self, limit: int, query: str = None) -> List[str]:
+        """Paths of the first limit items by (priority, last_accessed), optionally containing query."""
+        self._sort_pending()
+        if not query:
+            paths = []
+            for path in self._ordered():
+                if len(paths) == limit:
+                    break
+                paths.append(path)
+            return paths
+
+        query = query.lower()
+        candidates = self._candidates(query)
+        matches = lambda path: any(query in text for text in self._texts[path])
+        if candidates is not None and len(candidates) <= 64 * max(limit, 1):
+            ordered = sorted(candidates, key=lambda path: (-self._entries[path][0], -self._entries[path][1], self._entries[path][2]))
+            return [path for path in ordered if matches(path)][:limit]
+        paths = []
+        for path in self._ordered():
+            if len(paths) == limit:
+                break
+            if (candidates is None or path in candidates) and matches(path):
+                paths.append(path)
+        return paths
+
+
 class ContextHandler:
-    def __init__(self, session_dir: str):
+    def __init__(self, session_dir: str, save_delay: float = 0.0):
+        """save_delay > 0 coalesces the saves of changes made within that many seconds into one write."""
         self.session_dir = session_dir
         self.context_items: Dict[str, ContextItem] = {}
         self.context_file = Path(session_dir) / "context.json"
+        self.save_delay = save_delay
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._dirty = False
+        self._save_timer = None
         self._load_context()
-        
+        self.index = ContextIndex.build(self.context_items.values())
+
     def _load_context(self) -> None:
         """Load context from the session's context file if it exists."""
         if self.context_file.exists():
@@ -32,23 +280,65 @@ class ContextHandler:
                 print(f"Error loading context: {e}")
 
     def _save_context(self) -> None:
-        """Save current context to the session's context file."""
+        """Record that the context changed and save it, unless the save is deferred by a batch or save_delay."""
+        with self._lock:
+            self._dirty = True
+            if self._batch_depth:
+                return
+            if self.save_delay:
+                if self._save_timer is None:
+                    self._save_timer = threading.Timer(self.save_delay, self.flush)
+                    self._save_timer.daemon = True
+                    self._save_timer.start()
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """Write pending changes to context.json atomically (temp file and rename)."""
+        with self._lock:
+            self._save_timer = None
+            if not self._dirty:
+                return
+            context_data = [asdict(item) for item in self.context_items.values()]
+            self._dirty = False
+        tmp_path = self.context_file.with_suffix(".json.tmp")
         try:
-            with open(self.context_file, 'w') as f:
-                context_data = [
-                    {
-                        'type': item.type,
-                        'path': item.path,
-                        'metadata': item.metadata,
-                        'priority': item.priority,
-                        'last_accessed': item.last_accessed
-                    }
-                    for item in self.context_items.values()
-                ]
-                json.dump(context_data, f, indent=2)
+            with open(tmp_path, 'w') as f:
+                json.dump(context_data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.context_file)
         except Exception as e:
+            with self._lock:
+                self._dirty = True
             print(f"Error saving context: {e}")
 
+    @contextmanager
+    def batch(self):
+        """Group changes into one save. If the block raises, its changes are rolled back."""
+        with self._lock:
+            snapshot = dict(self.context_items) if self._batch_depth == 0 else None
+            self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            with self._lock:
+                if snapshot is not None:
+                    self.context_items = snapshot
+                    self.index = ContextIndex.build(snapshot.values())
+            raise
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+        if done and self._dirty:
+            self._save_context()
+
+    def close(self) -> None:
+        """Cancel any pending delayed save and write it now."""
+        with self._lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+        self.flush()
+
     def detect_git_repo(self, start_path: str = '.') -> Optional[str]:
         """Detect if the current directory is in a git repository."""
         try:
@@ -65,7 +355,7 @@ class ContextHandler:
         if repo_path:
             try:
                 repo = git.Repo(repo_path)
-                self.context_items[repo_path] = ContextItem(
+                self._put(ContextItem(
                     type="git_repo",
                     path=repo_path,
                     metadata={
@@ -74,65 +364,111 @@ class ContextHandler:
                         "last_commit": str(repo.head.commit.hexsha)
                     },
                     priority=10
-                )
+                ))
                 self._save_context()
             except Exception as e:
                 print(f"Error adding git context: {e}")
 
     def add_documentation(self, url: str, title: str, relevance: int = 5) -> None:
         """Add documentation URL to context."""
-        self.context_items[url] = ContextItem(
+        self._put(ContextItem(
             type="documentation",
             path=url,
             metadata={"title": title},
             priority=relevance
-        )
+        ))
         self._save_context()
 
     def add_file(self, file_path: str, file_type: str = "source", metadata: Dict = None) -> None:
         """Add a file to the context."""
         abs_path = str(Path(file_path).resolve())
-        self.context_items[abs_path] = ContextItem(
+        self._put(ContextItem(
             type=file_type,
             path=abs_path,
             metadata=metadata or {}
-        )
+        ))
         self._save_context()
 
     def add_directory(self, dir_path: str, include_patterns: List[str] = None) -> None:
-        """Add a directory and its relevant contents to context."""
+        """Add a directory and its relevant contents to context.
+
+        The tree is walked once with os.scandir, matching file names against all patterns.
+        .git, node_modules and paths ignored by .gitignore files are skipped, and the whole
+        directory is saved in one write.
+        """
         abs_path = str(Path(dir_path).resolve())
         if include_patterns is None:
             include_patterns = ['*.py', '*.js', '*.ts', '*.json', '*.md']
-            
-        self.context_items[abs_path] = ContextItem(
-            type="directory",
-            path=abs_path,
-            metadata={"include_patterns": include_patterns}
-        )
-        
-        # Add individual files that match patterns
-        for pattern in include_patterns:
-            for file_path in Path(abs_path).rglob(pattern):
-                self.add_file(str(file_path))
-        
-        self._save_context()
+
+        with self.batch():
+            self._put(ContextItem(
+                type="directory",
+                path=abs_path,
+                metadata={"include_patterns": include_patterns}
+            ))
+            for file_path in self._walk(abs_path, include_patterns):
+                self._put(ContextItem(type="source", path=file_path))
+            self._save_context()
+
+    def _walk(self, root: str, include_patterns: List[str]):
+        """Yield the files under root whose names match any of the patterns."""
+        gitignore = GitIgnore()
+        # .gitignore files between the repository root and root still apply
+        ancestors, parent = [], os.path.dirname(root)
+        while parent != os.path.dirname(parent) and not os.path.isdir(os.path.join(root, ".git")):
+            ancestors.append(parent)
+            if os.path.isdir(os.path.join(parent, ".git")):
+                for ancestor in reversed(ancestors):
+                    gitignore.add_file(os.path.join(ancestor, ".gitignore"))
+                break
+            parent = os.path.dirname(parent)
+
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            if any(entry.name == ".gitignore" for entry in entries):
+                gitignore.add_file(os.path.join(directory, ".gitignore"))
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir and entry.name in PRUNED_DIRS:
+                    continue
+                if gitignore.rules and gitignore.ignored(entry.path, is_dir):
+                    continue
+                if is_dir:
+                    stack.append(entry.path)
+                elif any(fnmatch.fnmatch(entry.name, pattern) for pattern in include_patterns):
+                    yield entry.path
+
+    def _put(self, item: ContextItem) -> None:
+        with self._lock:
+            self.context_items[item.path] = item
+            self.index.add(item)
 
     def get_relevant_context(self, query: str = None, limit: int = 10) -> List[ContextItem]:
-        """Get most relevant context items, optionally filtered by query."""
-        items = list(self.context_items.values())
-        
-        # Sort by priority and last accessed time
-        items.sort(key=lambda x: (-x.priority, -x.last_accessed))
-        
-        if query:
-            # Simple keyword matching - could be enhanced with more sophisticated matching
-            items = [item for item in items if query.lower() in item.path.lower() or 
-                    any(query.lower() in str(v).lower() for v in item.metadata.values())]
-        
-        return items[:limit]
+        """Get the most relevant context items by priority and last access, optionally filtered by query.
+
+        Returned items count as accessed. The new access times are saved with the next write.
+        """
+        now = time.time()
+        with self._lock:
+            items = [self.context_items[path] for path in self.index.top(limit, query)]
+            for item in items:
+                item.last_accessed = now
+            self.index.touch([item.path for item in items], now)
+            if items:
+                self._dirty = True
+        return items
 
     def clear_context(self) -> None:
         """Clear all context items."""
-        self.context_items.clear()
-        self._save_context() 
\ No newline at end of file
+        with self._lock:
+            self.context_items.clear()
+            self.index = ContextIndex()
+        self._save_context()
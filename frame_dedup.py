@@ -0,0 +1,95 @@
+import math
+from collections import deque
+from datetime import datetime
+
+from PIL import Image
+
+from region_diff import changed_tiles
+
+
+def dhash(image, hash_size=16):
+    """Compute a difference hash of the image as an int of hash_size * hash_size bits."""
+    small = image.resize((hash_size + 1, hash_size), Image.BOX).convert("L")
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def tile_thumbnail(image, tile_size=32, cells=8):
+    """Grayscale image reduced to cells x cells pixels per tile, for comparing frames tile by tile."""
+    columns, rows = math.ceil(image.width / tile_size), math.ceil(image.height / tile_size)
+    return image.convert("L").resize((columns * cells, rows * cells), Image.BOX)
+
+
+class FrameDeduplicator:
+    """Remembers recent frames to skip near-duplicate captures.
+
+    A frame is a near-duplicate of a recently seen one when fewer than `threshold` bits of
+    their perceptual hashes differ and at most `max_changed_tiles` tiles changed, so a
+    ticking clock or a blinking cursor doesn't count as activity. The global hash can't
+    see text edits on its own, so it picks the candidate and a per-tile thumbnail (8x8
+    pixels per tile) decides. A threshold of 0 disables deduplication.
+    """
+
+    TILE_CELLS = 8
+
+    def __init__(self, threshold=5, history=8, hash_size=16, tile_size=32, pixel_threshold=16, max_changed_tiles=4):
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.tile_size = tile_size
+        self.pixel_threshold = pixel_threshold
+        self.max_changed_tiles = max_changed_tiles
+        self.recent = deque(maxlen=max(history, 1))  # (hash, tile thumbnail, first_seen), newest last
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            threshold=config.get("capture_after_screen_change", 5),
+            history=config.get("dedup_history", 8),
+            hash_size=config.get("dedup_hash_size", 16),
+            tile_size=config.get("region_tile_size", 32),
+            pixel_threshold=config.get("region_pixel_threshold", 16),
+            max_changed_tiles=config.get("dedup_max_changed_tiles", 4),
+        )
+
+    def check(self, image, timestamp=None):
+        """Return (is_duplicate, first_seen, is_latest) for the frame and remember it.
+
+        first_seen is when the matching frame was first captured and is_latest tells
+        whether the match is the previous frame or an older one being revisited.
+        """
+        timestamp = timestamp or datetime.now()
+        if self.threshold <= 0:
+            return False, None, False
+
+        frame_hash = dhash(image, self.hash_size)
+        tiles = tile_thumbnail(image, self.tile_size, self.TILE_CELLS)
+        for index in range(len(self.recent) - 1, -1, -1):
+            seen_hash, seen_tiles, first_seen = self.recent[index]
+            if hamming_distance(frame_hash, seen_hash) < self.threshold and self._similar(seen_tiles, tiles):
+                is_latest = index == len(self.recent) - 1
+                if not is_latest:
+                    # Move the revisited screen to the front so it becomes the baseline again
+                    del self.recent[index]
+                    self.recent.append((seen_hash, seen_tiles, first_seen))
+                return True, first_seen, is_latest
+
+        self.recent.append((frame_hash, tiles, timestamp))
+        return False, None, False
+
+    def _similar(self, seen_tiles, tiles):
+        if seen_tiles.size != tiles.size:
+            return False
+        _, _, flags = changed_tiles(seen_tiles, tiles, self.TILE_CELLS, self.pixel_threshold)
+        return sum(flags) <= self.max_changed_tiles
+
+    def reset(self):
+        self.recent.clear()
@@ -0,0 +1,87 @@
+import heapq
+import math
+import re
+import threading
+from itertools import islice
+
+_TERM_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric terms; snake_case identifiers and file.names are split into words."""
+    return _TERM_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Incrementally maintained BM25 inverted index over log entries.
+
+    Documents are added in order and identified by their position in the log.
+    Every query term is scored, except stopword-level terms present in more than
+    stopword_ratio of the documents (unless the query has nothing else). Terms with
+    more than max_postings postings only have their newest max_postings scanned for
+    new candidates, and none once shorter lists found k; documents found through other
+    terms still get their exact score for them, so query cost stays bounded as the log grows.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, stopword_ratio=0.5, max_postings=2000):
+        self.k1 = k1
+        self.b = b
+        self.stopword_ratio = stopword_ratio
+        self.max_postings = max_postings
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths = []
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, text):
+        """Index text as the next document and return its id."""
+        terms = tokenize(text)
+        with self._lock:
+            doc_id = len(self.doc_lengths)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    self.postings[term] = {doc_id: count}
+                else:
+                    postings[doc_id] = count
+            self.doc_lengths.append(len(terms))
+            self.total_length += len(terms)
+            return doc_id
+
+    def search(self, query, k=10):
+        """Return up to k (doc_id, score) pairs, best first."""
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return []
+            query_postings = [self.postings[t] for t in set(tokenize(query)) if t in self.postings]
+            informative = [p for p in query_postings if len(p) <= self.stopword_ratio * doc_count]
+            query_postings = informative or query_postings
+            # Short posting lists first: they are scanned in full and find the candidates
+            query_postings.sort(key=len)
+
+            k1 = self.k1
+            length_base = k1 * (1 - self.b)
+            length_scale = k1 * self.b * doc_count / self.total_length if self.total_length else 0.0
+            doc_lengths = self.doc_lengths
+            scores = {}
+            for postings in query_postings:
+                df = len(postings)
+                weight = math.log(1 + (doc_count - df + 0.5) / (df + 0.5)) * (k1 + 1)
+                if df <= self.max_postings:
+                    matches = postings.items()
+                else:
+                    # Dicts keep insertion order, so reversed() walks the newest documents first.
+                    # Once the shorter lists found k candidates, a long one only adds to their scores.
+                    recent = {} if len(scores) >= k else dict(islice(reversed(postings.items()), self.max_postings))
+                    found = ((doc_id, postings.get(doc_id)) for doc_id in scores if doc_id not in recent)
+                    matches = [*recent.items(), *((doc_id, tf) for doc_id, tf in found if tf)]
+                for doc_id, tf in matches:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf / (tf + length_base + length_scale * doc_lengths[doc_id])
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
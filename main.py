@@ -1,9 +1,4 @@
-import sys
-import threading
-import time
 import os
-import select
-import json
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.panel import Panel
@@ -25,6 +20,9 @@ logger = logging.getLogger("main")
 # Initialize Rich console
 console = Console()
 
+# The previous session's log doesn't change, so its description can be reused across launches
+PREVIOUS_SESSION_CACHE_TTL = 7 * 24 * 3600
+
 if __name__ == "__main__":
     # Display welcome message and session options
     welcome_text = """
@@ -44,8 +42,11 @@ Screen capture is automatically paused when you return to this window.
         previous_session_log = open(
             previous_session["session_log_filepath"], "r"
         ).read()
+        if previous_session["carried_summary"]:
+            previous_session_log = f"Summary of earlier sessions: {previous_session['carried_summary']}\n{previous_session_log}"
         previous_session_description = app.app_prompts.prompt(
-            f"In as few words as possible, describe the previous productivity session. Speak to the user as if you were a human assistant. Log: {previous_session_log}"
+            f"In as few words as possible, describe the previous productivity session. Speak to the user as if you were a human assistant. Log: {previous_session_log}",
+            cache_ttl=PREVIOUS_SESSION_CACHE_TTL,
         )
         console.print(
             f"[bold blue]📰 Previously on CodeBuddy:[/] {previous_session_description}"
@@ -69,17 +70,13 @@ Screen capture is automatically paused when you return to this window.
         ).strip()
 
     with console.status("[bold yellow]Initializing...[/]", spinner="dots"):
-        app.initialize_session(previous_session)
+        app.initialize_session(previous_session, carried_summary=previous_session_description if previous_session else None)
 
     if initial_objective:
-        app.session.write_to_log(
-            f"USER'S STATED CURRENT OBJECTIVE: {initial_objective}",
-        )
+        app.session.set_objective(initial_objective)
 
-    # Start the handlers
-    input_thread = threading.Thread(target=app._check_for_input)
-    input_thread.daemon = True
-    input_thread.start()
+    # Start the input thread; capture was started with the session
+    app.listen_for_input()
 
     console.print(
         f"[bold green]Session started {app.session.current_session['session_id']}, capturing every {app.capture_interval} seconds[/]"
@@ -87,18 +84,17 @@ Screen capture is automatically paused when you return to this window.
 
     try:
         while True:
-            if app.user_input_queue:
-                action = app.user_input_queue.pop(0)
-                if action == "inquiry":
-                    console.print(
-                        "\n[bold green]Entering inquiry mode. Screen capture paused.[/]"
-                    )
-                    app.prompt_user()  # Use the handler_manager's prompt_user method
-                    # Start a new input checking thread after returning from prompt_user
-                    input_thread = threading.Thread(target=app._check_for_input)
-                    input_thread.daemon = True
-                    input_thread.start()
-            time.sleep(0.1)
+            action = app.events.get()
+            if action == "inquiry":
+                console.print(
+                    "\n[bold green]Entering inquiry mode. Screen capture paused.[/]"
+                )
+                if not app.prompt_user():
+                    break
+                app.listen_for_input()
+            elif action == "exit":
+                break
     except KeyboardInterrupt:
         console.print("\n[red]Exiting...[/]")
-        os._exit(0)
+    finally:
+        app.shutdown()
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class SessionMetrics:
+    """Thread-safe counters and observations collected during a session.
+
+    Observations keep running count/total/min/max plus the most recent `sample_size`
+    values, from which the snapshot reports percentiles.
+    """
+
+    def __init__(self, sample_size=1024):
+        self._lock = threading.Lock()
+        self.sample_size = sample_size
+        self.counters = {}
+        self.observations = {}
+        self._samples = {}
+        # Token usage per model: requests, input/output tokens and request seconds
+        self.usage = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            stats = self.observations.get(name)
+            if stats is None:
+                self.observations[name] = {"count": 1, "total": value, "min": value, "max": value, "last": value}
+                self._samples[name] = deque([value], maxlen=self.sample_size)
+                return
+            self._samples[name].append(value)
+            stats["count"] += 1
+            stats["total"] += value
+            stats["min"] = min(stats["min"], value)
+            stats["max"] = max(stats["max"], value)
+            stats["last"] = value
+
+    def record_usage(self, model, input_tokens, output_tokens, seconds=None):
+        with self._lock:
+            usage = self.usage.setdefault(model, {"requests": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0})
+            usage["requests"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["seconds"] += seconds or 0.0
+
+    @contextmanager
+    def timer(self, name):
+        """Observe the wall time of the with-block in seconds under name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            observations = {}
+            for name, stats in self.observations.items():
+                samples = sorted(self._samples[name])
+                observations[name] = {
+                    **stats,
+                    "mean": stats["total"] / stats["count"],
+                    **{f"p{pct}": percentile(samples, pct) for pct in PERCENTILES},
+                }
+            usage = {model: dict(stats) for model, stats in self.usage.items()}
+            return {"counters": dict(self.counters), "observations": observations, "usage": usage}
+
+    def save(self, path):
+        """Atomically write a JSON snapshot to path."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class MetricsReporter:
+    """Periodically writes the session's metrics in the background.
+
+    metrics.json is replaced with the latest snapshot, and one line per interval is
+    appended to metrics.jsonl. That history file is rolled over to metrics.jsonl.1 once
+    it exceeds max_history_bytes.
+    """
+
+    def __init__(self, session, interval=30, max_history_bytes=5 * 1024 * 1024):
+        self.session = session
+        self.interval = interval
+        self.max_history_bytes = max_history_bytes
+        self.logger = logging.getLogger('MetricsReporter')
+        self.history_filepath = os.path.join(session.current_session['session_dir'], "metrics.jsonl")
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, session):
+        return cls(
+            session,
+            interval=session.config.get("metrics_interval", 30),
+            max_history_bytes=session.config.get("metrics_history_max_bytes", 5 * 1024 * 1024),
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-reporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop reporting after writing a final report."""
+        self._stopped.set()
+        self._safe_report()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._safe_report()
+
+    def _safe_report(self):
+        try:
+            self.report()
+        except OSError as e:
+            self.logger.warning(f"Failed to write metrics: {e}")
+
+    def report(self):
+        snapshot = self.session.metrics.snapshot()
+        self.session.metrics.save(self.session.current_session['metrics_filepath'])
+        if os.path.exists(self.history_filepath) and os.path.getsize(self.history_filepath) > self.max_history_bytes:
+            os.replace(self.history_filepath, f"{self.history_filepath}.1")
+        line = {"timestamp": datetime.now().isoformat(timespec='seconds'), **snapshot}
+        with open(self.history_filepath, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+
+def _metric_name(name):
+    return "codebuddy_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(snapshot, labels=None):
+    """Render a metrics snapshot in the Prometheus text exposition format.
+
+    Counters become `<name>_total`, observations become summaries with p50/p95/p99
+    quantiles, and token usage is labelled by model.
+    """
+    base = ",".join(f'{key}="{_label_value(value)}"' for key, value in (labels or {}).items())
+
+    def series(name, value, **extra):
+        label_text = ",".join(filter(None, [base] + [f'{key}="{_label_value(v)}"' for key, v in extra.items()]))
+        return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", series(metric, value)]
+    for name, stats in sorted(snapshot["observations"].items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} summary")
+        for pct in PERCENTILES:
+            lines.append(series(metric, stats[f"p{pct}"], quantile=pct / 100))
+        lines += [series(f"{metric}_sum", stats["total"]), series(f"{metric}_count", stats["count"])]
+    for field in ("requests", "input_tokens", "output_tokens", "seconds"):
+        metric = _metric_name(f"model_{field}") + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        for model, usage in sorted(snapshot.get("usage", {}).items()):
+            lines.append(series(metric, usage[field], model=model))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the current metrics as Prometheus text on http://host:port/metrics."""
+
+    def __init__(self, get_snapshot, host="127.0.0.1", port=9464, labels=None):
+        self.get_snapshot = get_snapshot
+        self.labels = labels or (lambda: {})
+        self.logger = logging.getLogger('MetricsServer')
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, get_snapshot, labels=None):
+        """Start the endpoint if `metrics_port` is set. Returns None if disabled or the port is taken."""
+        port = config.get("metrics_port")
+        if not port:
+            return None
+        try:
+            return cls(get_snapshot, config.get("metrics_host", "127.0.0.1"), port, labels).start()
+        except OSError as e:
+            logging.getLogger('MetricsServer').warning(f"Metrics endpoint disabled, could not bind port {port}: {e}")
+            return None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus(server.get_snapshot(), server.labels()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,76 @@
+import logging
+from typing import NamedTuple
+
+
+class OCRResult(NamedTuple):
+    text: str
+    confidence: float  # mean word confidence, 0-100
+    coverage: float  # fraction of the image covered by recognized words
+
+
+class ScreenOCR:
+    """Reads text-heavy screenshots (editors, terminals, docs) locally with Tesseract.
+
+    A frame takes the text path when the mean word confidence is at least min_confidence
+    and recognized words cover at least min_coverage of the image; graphical screens fall
+    back to the image path. Needs the optional pytesseract package and the tesseract binary.
+    """
+
+    def __init__(self, min_confidence=75, min_coverage=0.12, min_words=20, max_chars=6000, language="eng"):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.min_confidence = min_confidence
+        self.min_coverage = min_coverage
+        self.min_words = min_words
+        self.max_chars = max_chars
+        self.language = language
+        self.logger = logging.getLogger('ScreenOCR')
+
+    @classmethod
+    def from_config(cls, config):
+        """Returns None unless `ocr_enabled` is set and pytesseract can be imported."""
+        if not config.get("ocr_enabled"):
+            return None
+        try:
+            return cls(
+                min_confidence=config.get("ocr_min_confidence", 75),
+                min_coverage=config.get("ocr_min_coverage", 0.12),
+                min_words=config.get("ocr_min_words", 20),
+                max_chars=config.get("ocr_max_chars", 6000),
+                language=config.get("ocr_language", "eng"),
+            )
+        except ImportError:
+            logging.getLogger('ScreenOCR').warning("ocr_enabled is set but pytesseract is not installed, sending images")
+            return None
+
+    def read(self, image):
+        """OCR the image and return an OCRResult, or None if Tesseract fails."""
+        try:
+            data = self._pytesseract.image_to_data(image, lang=self.language, output_type=self._pytesseract.Output.DICT)
+        except Exception as e:
+            self.logger.warning(f"OCR failed: {e}")
+            return None
+        lines, confidences, area = {}, [], 0
+        for index, word in enumerate(data["text"]):
+            confidence = float(data["conf"][index])
+            if not word.strip() or confidence < 0:
+                continue
+            confidences.append(confidence)
+            area += data["width"][index] * data["height"][index]
+            key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            lines.setdefault(key, []).append(word)
+        text = "\n".join(" ".join(words) for words in lines.values())
+        return OCRResult(
+            text=text[:self.max_chars],
+            confidence=sum(confidences) / len(confidences) if confidences else 0.0,
+            coverage=area / (image.width * image.height),
+        )
+
+    def accepts(self, result):
+        """Whether the OCR text is good enough to stand in for the image."""
+        return (
+            result is not None
+            and len(result.text.split()) >= self.min_words
+            and result.confidence >= self.min_confidence
+            and result.coverage >= self.min_coverage
+        )
@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from collections import deque
+
+BACKPRESSURE_POLICIES = ("drop_oldest", "coalesce", "block")
+
+
+class FrameQueue:
+    """Bounded queue between the capture stage and the inference workers.
+
+    When full, the backpressure policy decides what happens to a new frame:
+    - drop_oldest: the oldest queued frame is discarded
+    - coalesce: the newest queued frame is replaced by the incoming one
+    - block: the producer waits until a worker frees a slot
+    """
+
+    def __init__(self, maxsize=4, policy="drop_oldest", on_drop=None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.maxsize = max(maxsize, 1)
+        self.policy = policy
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        dropped = None
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == "block":
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                elif self.policy == "drop_oldest":
+                    dropped = self._items.popleft()
+                else:
+                    dropped = self._items.pop()
+            if self._closed:
+                dropped = item
+            else:
+                self._items.append(item)
+                self._cond.notify_all()
+        if dropped is not None and self.on_drop:
+            self.on_drop(dropped)
+
+    def get(self):
+        """Block until a frame is available. Returns None once closed and drained."""
+        batch = self.get_batch()
+        return batch[0] if batch else None
+
+    def get_batch(self, max_items=1, max_wait=0.0):
+        """Block until a frame is available, then collect up to max_items frames,
+        waiting at most max_wait seconds for the batch to fill. Returns [] once closed and drained.
+        """
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            deadline = time.monotonic() + max_wait
+            while len(self._items) < max_items and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._items.popleft() for _ in range(min(max_items, len(self._items)))]
+            self._cond.notify_all()
+            return batch
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class OrderedLogWriter:
+    """Writes log entries in reservation order even when they are committed out of order.
+
+    Entries are dicts of keyword arguments for the write function (message, kind, ...).
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._next_to_write = 0
+        self._pending = {}
+
+    def reserve(self):
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            return seq
+
+    def commit(self, seq, entries, timestamp=None):
+        """Queue a reservation's entries for writing. A seq that was already committed is left as is."""
+        with self._lock:
+            if seq < self._next_to_write or seq in self._pending:
+                return
+            self._pending[seq] = (entries, timestamp)
+            while self._next_to_write in self._pending:
+                ready_entries, ready_timestamp = self._pending.pop(self._next_to_write)
+                for entry in ready_entries:
+                    self._write(**entry, timestamp=ready_timestamp)
+                self._next_to_write += 1
+
+    def skip(self, seq):
+        self.commit(seq, [])
+
+
+class InferencePipeline:
+    """Runs captured frames through N inference workers behind a bounded queue.
+
+    Each worker takes up to batch_size frames (waiting at most batch_wait seconds for a
+    batch to fill) and passes them to process_batch, which returns one list of log
+    entries per frame.
+    """
+
+    def __init__(self, process_batch, writer, workers=2, queue_size=4, backpressure="drop_oldest",
+                 batch_size=1, batch_wait=0.0):
+        self.process_batch = process_batch
+        self.writer = writer
+        self.batch_size = max(batch_size, 1)
+        self.batch_wait = batch_wait
+        self.logger = logging.getLogger('InferencePipeline')
+        self.queue = FrameQueue(max(queue_size, self.batch_size), backpressure, on_drop=self._on_drop)
+        self.workers = [
+            threading.Thread(target=self._worker_loop, name=f"inference-{i}", daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        self.dropped_frames = 0
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, frame):
+        self.queue.put(frame)
+
+    @property
+    def full(self):
+        """Whether submitting now would drop a queued frame."""
+        return self.queue.policy != "block" and len(self.queue) >= self.queue.maxsize
+
+    def stop(self, timeout=None):
+        self.queue.close()
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.join(timeout)
+
+    def _on_drop(self, frame):
+        self.dropped_frames += 1
+        self.logger.warning(f"Dropped frame {frame.seq} captured at {frame.captured_at:%H:%M:%S} (backpressure: {self.queue.policy})")
+        self.writer.skip(frame.seq)
+
+    def _worker_loop(self):
+        while True:
+            frames = self.queue.get_batch(self.batch_size, self.batch_wait)
+            if not frames:
+                return
+            try:
+                results = self.process_batch(frames)
+            except Exception as e:
+                self.logger.error(f"Failed to process frames {[f.seq for f in frames]}: {e}", exc_info=True)
+                results = []
+            for index, frame in enumerate(frames):
+                entries = results[index] if index < len(results) else []
+                self.writer.commit(frame.seq, entries or [], timestamp=frame.captured_at)
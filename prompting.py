@@ -1,7 +1,12 @@
 import datetime
+import json
 import os
-import requests
-from utils import append_log
+import time
+from utils import append_log, compose_mosaic, decode_image, encode_image, estimate_tokens
+from summarizer import assemble_context, assemble_lineage_context
+from ocr import ScreenOCR
+from transport import get_transport
+from response_cache import ResponseCache, get_response_cache
 from tools.suggested_context_finder import SuggestedContextFinder
 
 built_in_providers = [
@@ -41,14 +46,28 @@ built_in_providers = [
 ]
 
 
+def usage_tokens(usage):
+    """(input, output) token counts from an OpenAI- or Anthropic-style usage mapping."""
+    if not isinstance(usage, dict):
+        return 0, 0
+    return (
+        usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0,
+        usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0,
+    )
+
+
 class Client:
-    def __init__(self, model_config, providers=built_in_providers):
+    def __init__(self, model_config, providers=built_in_providers, cache=None, on_usage=None):
         self.provider = next(p for p in providers if model_config["model"] in p["models"])
         self.api_key = self.provider.get("api_key_name") and os.getenv(self.provider["api_key_name"])
         self.base_url = self.provider.get("base_url", "http://localhost:8000/")
         self.model = model_config["model"]
         self.chat_completions_url = self.provider.get("chat_completions_url", "chat/completions")
         self.extra_headers = self.provider.get("extra_headers", {})
+        self.transport = get_transport(self.provider)
+        self.cache = cache
+        # Called with (model, input_tokens, output_tokens, seconds) after each request that reached the provider
+        self.on_usage = on_usage
 
     def _get_nested_value(self, obj, path):
         """Get a value from a nested dictionary using a dot-separated path"""
@@ -62,7 +81,7 @@ class Client:
                 return None
         return obj
 
-    def create_chat_completion(self, messages, system_message=None, max_tokens=None):
+    def _build_request(self, messages, system_message=None, max_tokens=None):
         headers = {
             "Content-Type": "application/json",
             **self.extra_headers  # Merge provider-specific extra headers
@@ -83,11 +102,33 @@ class Client:
             elif self.provider.get("system") == "top_level_field":
                 payload["system"] = system_message
 
-        response = requests.post(
+        return headers, payload
+
+    def _cache_key(self, messages, system_message, max_tokens, bypass_cache):
+        if not self.cache or bypass_cache:
+            return None
+        return ResponseCache.make_key(self.provider.get("provider"), self.model, system_message, messages, max_tokens)
+
+    def create_chat_completion(self, messages, system_message=None, max_tokens=None, cache_ttl=None, bypass_cache=False):
+        """Send a chat completion request and map the response.
+
+        When the client has a response cache, identical requests are answered from it
+        (the result then has `cached: True`). cache_ttl overrides the cache's default
+        expiry for this call and bypass_cache skips the cache entirely.
+        """
+        cache_key = self._cache_key(messages, system_message, max_tokens, bypass_cache)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        headers, payload = self._build_request(messages, system_message, max_tokens)
+
+        started = time.monotonic()
+        response = self.transport.post(
             f"{self.base_url}{self.chat_completions_url}",
             headers=headers,
             json=payload,
-            timeout=60  # Add timeout to handle slow local models
         )
         response.raise_for_status()
         raw_response = response.json()
@@ -98,8 +139,116 @@ class Client:
             key: self._get_nested_value(raw_response, path)
             for key, path in mapping.items()
         }
+        self._report_usage(mapped_response, time.monotonic() - started)
+        if cache_key:
+            self.cache.put(cache_key, mapped_response, ttl=cache_ttl)
         return mapped_response
 
+    def _report_usage(self, response, seconds):
+        if self.on_usage:
+            self.on_usage(response.get("model") or self.model, *usage_tokens(response.get("usage")), seconds)
+
+    @property
+    def stream_format(self):
+        """SSE dialect of the provider: explicit `stream_format`, else inferred from response_mapping."""
+        if "stream_format" in self.provider:
+            return self.provider["stream_format"]
+        content_path = self.provider.get("response_mapping", {}).get("content", "")
+        return "openai" if content_path.startswith("choices") else "anthropic"
+
+    def stream_chat_completion(self, messages, system_message=None, max_tokens=None, on_text=None,
+                               cache_ttl=None, bypass_cache=False):
+        """Like create_chat_completion, but streams the answer over SSE and calls on_text
+        with each text delta as it arrives.
+
+        The returned dict has the full `content`, `model` and `usage`, plus `latency` with
+        `time_to_first_token` and `total` in seconds. Providers with `"streaming": false`
+        fall back to a single non-streaming request. Cached answers are delivered in one piece.
+        """
+        started = time.monotonic()
+        cache_key = self._cache_key(messages, system_message, max_tokens, bypass_cache)
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached is not None or not self.provider.get("streaming", True):
+            response = {**cached, "cached": True} if cached is not None else self.create_chat_completion(
+                messages, system_message, max_tokens, cache_ttl=cache_ttl, bypass_cache=bypass_cache
+            )
+            elapsed = time.monotonic() - started
+            if on_text and response.get("content"):
+                on_text(response["content"])
+            response["latency"] = {"time_to_first_token": elapsed, "total": elapsed}
+            return response
+
+        headers, payload = self._build_request(messages, system_message, max_tokens)
+        payload["stream"] = True
+        if self.stream_format == "openai" and self.provider.get("stream_usage", True):
+            # OpenAI only reports usage for streamed answers when asked to
+            payload["stream_options"] = {"include_usage": True}
+        response = self.transport.post(
+            f"{self.base_url}{self.chat_completions_url}",
+            headers=headers,
+            json=payload,
+            stream=True,
+        )
+
+        parts, model, usage, first_token_at = [], self.model, None, None
+        with response:
+            response.raise_for_status()
+            for event in self._iter_sse_events(response):
+                text, event_model, event_usage = self._parse_stream_event(event)
+                model = event_model or model
+                if event_usage:
+                    usage = {**(usage or {}), **event_usage}
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    parts.append(text)
+                    if on_text:
+                        on_text(text)
+
+        finished = time.monotonic()
+        result = {"content": "".join(parts), "model": model, "usage": usage}
+        self._report_usage(result, finished - started)
+        if cache_key:
+            self.cache.put(cache_key, result, ttl=cache_ttl)
+        result["latency"] = {
+            "time_to_first_token": (first_token_at or finished) - started,
+            "total": finished - started,
+        }
+        return result
+
+    def _iter_sse_events(self, response):
+        """Yield decoded JSON payloads of server-sent events until the stream ends."""
+        # SSE is always UTF-8; requests would default a text/event-stream without a charset to ISO-8859-1
+        for raw_line in response.iter_lines():
+            line = raw_line.decode("utf-8", errors="replace")
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            try:
+                yield json.loads(data)
+            except ValueError:
+                continue
+
+    def _parse_stream_event(self, event):
+        """Return (text delta, model, usage) from one streamed event."""
+        if self.stream_format == "openai":
+            return (
+                self._get_nested_value(event, "choices.0.delta.content"),
+                event.get("model"),
+                event.get("usage"),
+            )
+
+        event_type = event.get("type")
+        if event_type == "content_block_delta":
+            return self._get_nested_value(event, "delta.text"), None, None
+        if event_type == "message_start":
+            return None, self._get_nested_value(event, "message.model"), self._get_nested_value(event, "message.usage")
+        if event_type == "message_delta":
+            return None, None, event.get("usage")
+        return None, None, None
+
 
 class AppPrompts:
     def __init__(self, config):
@@ -113,11 +262,13 @@ class AppPrompts:
                 self.models.append({"model": model})
         
         client_config = next(m for m in self.models if m["model"] == config["qa_model"])
-        self.client = Client(client_config, providers=self.providers)
+        self.cache = get_response_cache(config)
+        self.client = Client(client_config, providers=self.providers, cache=self.cache)
 
-    def prompt(self, prompt_text):
+    def prompt(self, prompt_text, cache_ttl=None):
         response = self.client.create_chat_completion(
-            messages=[{"role": "user", "content": prompt_text}]
+            messages=[{"role": "user", "content": prompt_text}],
+            cache_ttl=cache_ttl,
         )
         return response["content"]
 
@@ -126,6 +277,8 @@ class CustomInstructions:
         self.vision = self.load_instructions("instructions_vision.txt")
         self.qa = self.load_instructions("instructions_qa.txt")
         self.privacy = self.load_instructions("instructions_privacy.txt")
+        self.vision_batch = self.load_instructions("instructions_vision_batch.txt")
+        self.summary = self.load_instructions("instructions_summary.txt")
     
     def load_instructions(self, filepath):
         with open(filepath, 'r') as file:
@@ -145,21 +298,69 @@ class SessionPrompts:
             for model in provider["models"]:
                 self.models.append({"model": model})
 
+        # Screenshots are never repeated byte for byte, so only text prompts go through the cache
+        self.cache = get_response_cache(config)
         self.vision = Client(
             next(m for m in self.models if m["model"] == config["screen_vision_model"]),
-            providers=self.providers
+            providers=self.providers,
+            on_usage=self._record_usage
         )
         self.qa = Client(
             next(m for m in self.models if m["model"] == config["qa_model"]),
-            providers=self.providers
+            providers=self.providers,
+            cache=self.cache,
+            on_usage=self._record_usage
         )
         self.privacy_vision = Client(
             next(m for m in self.models if m["model"] == config["privacy_vision_model"]),
-            providers=self.providers
+            providers=self.providers,
+            on_usage=self._record_usage
+        )
+        self.summary = Client(
+            next(m for m in self.models if m["model"] == config.get("summary_model", config["screen_vision_model"])),
+            providers=self.providers,
+            cache=self.cache,
+            on_usage=self._record_usage
         )
+        # Cheap text model for screenshots read by OCR; without one the OCR text itself is logged
+        self.ocr_text = Client(
+            next(m for m in self.models if m["model"] == config["ocr_text_model"]),
+            providers=self.providers,
+            cache=self.cache,
+            on_usage=self._record_usage
+        ) if config.get("ocr_text_model") else None
+        self.ocr = ScreenOCR.from_config(config)
+        self.qa_context_tokens = config.get("qa_context_tokens", 24_000)
+        self.qa_retrieval_top_k = config.get("qa_retrieval_top_k", 20)
+        self.continue_max_depth = config.get("continue_max_depth", 3)
 
         self.context_finder = SuggestedContextFinder()
         self.interval = config["capture_interval"]
+        self.batch_mode = config.get("vision_batch_mode", "multi_image")
+        self.image_format = config.get("image_format", "png")
+        self.image_quality = config.get("image_quality", 80)
+
+    def _record_usage(self, model, input_tokens, output_tokens, seconds):
+        self.session.metrics.record_usage(model, input_tokens, output_tokens, seconds)
+        self.session.metrics.observe("model_request_seconds", seconds)
+        if self.session.budget:
+            self.session.budget.record(model, input_tokens, output_tokens)
+
+    def has_model(self, model):
+        return any(m["model"] == model for m in self.models)
+
+    def set_vision_model(self, model):
+        """Switch the model used to describe screenshots (e.g. to stay within a budget)."""
+        self.vision = Client(
+            next(m for m in self.models if m["model"] == model),
+            providers=self.providers,
+            on_usage=self._record_usage
+        )
+
+    @property
+    def vision_concurrency(self):
+        """Number of vision requests the provider allows in flight at once."""
+        return self.vision.transport.max_concurrency
 
     @property
     def session_log_filepath(self):
@@ -171,40 +372,209 @@ class SessionPrompts:
         )
         return response["content"]
 
-    def process_screenshot(self, base64_image, filename, active_window_title):
+    def summarize(self, text, kind="log entries"):
+        """Summarize a span of the activity log with the summary model."""
+        response = self.summary.create_chat_completion(
+            system_message=self.custom_instructions.summary,
+            messages=[{"role": "user", "content": f"Summarize these {kind}:\n{text}"}],
+            max_tokens=1000,
+        )
+        return response["content"]
+
+    def describe_from_text(self, image, active_window_title, captured_at=None):
+        """Text path: OCR the screenshot locally and describe it without sending the image.
+
+        Returns (description, log record fields), or None when OCR is off or the screen isn't
+        text-heavy enough and the image should go to the vision model instead. Without an
+        ocr_text_model, or if it fails, the OCR text itself is the description.
+        """
+        if not self.ocr:
+            return None
+        captured_at = captured_at or datetime.datetime.now()
+        metrics = self.session.metrics
+        with metrics.timer("stage_ocr_seconds"):
+            result = self.ocr.read(image)
+        if result:
+            metrics.observe("ocr_confidence", result.confidence)
+            metrics.observe("ocr_coverage", result.coverage)
+        if not self.ocr.accepts(result):
+            metrics.increment("frames_image_path")
+            return None
+        metrics.increment("frames_text_path")
+        fields = {"path": "text", "ocr_confidence": round(result.confidence, 1), "ocr_coverage": round(result.coverage, 3)}
+        if self.ocr_text:
+            description = self.describe_screen_text(result.text, active_window_title, captured_at)
+            if description is not None:
+                return description, {"model": self.ocr_text.model, **fields}
+        return f"Screen text (OCR):\n{result.text}", fields
+
+    def describe_screenshot(self, images, active_window_title, captured_at=None):
+        """Ask the vision model to describe a screenshot. Returns None on failure.
+
+        images is a list of (EncodedImage, caption) pairs: either the full frame, or a
+        low-resolution overview followed by crops of the regions that changed.
+        """
+        captured_at = captured_at or datetime.datetime.now()
         try:
             system_message = self.custom_instructions.vision.replace("{capture_interval}", str(self.interval))
+            content = [
+                {
+                    "type": "text",
+                    "text": f"Screenshot of the user's screen taken at {captured_at.strftime('%Y-%m-%d %H:%M:%S')}. The active window is: {active_window_title}",
+                },
+            ]
+            for image, caption in images:
+                if caption:
+                    content.append({"type": "text", "text": caption})
+                content.append({"type": "image_url", "image_url": {"url": image.data_url}})
+
             response = self.vision.create_chat_completion(
                 system_message=system_message,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": f"Screenshot of the user's screen taken at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}. The active window is: {active_window_title}",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
-                                },
-                            },
-                        ],
-                    },
-                ],
+                messages=[{"role": "user", "content": content}],
                 max_tokens=2000,
             )
+            self._record_vision_usage(response, frames=1)
 
-            vision_response = response["content"]
-            self.session.write_to_log(f"Active window: {active_window_title}")
-            self.session.write_to_log(vision_response)
-            return True
+            return response["content"]
         except Exception as e:
             print(f"Failed to send screenshot to vision model: {e}")
-            return False
+            return None
+
+    def describe_screen_text(self, text, active_window_title, captured_at):
+        """Describe a screenshot from its OCR text with the ocr_text_model. Returns None on failure."""
+        try:
+            system_message = self.custom_instructions.vision.replace("{capture_interval}", str(self.interval))
+            response = self.ocr_text.create_chat_completion(
+                system_message=system_message,
+                messages=[{
+                    "role": "user",
+                    "content": f"The screenshot taken at {captured_at.strftime('%Y-%m-%d %H:%M:%S')} was converted to text with OCR. "
+                               f"The active window is: {active_window_title}\n\n{text}",
+                }],
+                max_tokens=1000,
+            )
+            return response["content"]
+        except Exception as e:
+            print(f"Failed to describe screenshot text: {e}")
+            return None
+
+    def triage_screenshot(self, images, active_window_title, captured_at, previous_description=None):
+        """Ask the local privacy vision model for a description, confidence, novelty and sensitivity verdict.
+
+        Returns the parsed JSON object, or None if the request fails or the answer isn't JSON.
+        """
+        try:
+            content = [{
+                "type": "text",
+                "text": f"Screenshot of the user's screen taken at {captured_at.strftime('%Y-%m-%d %H:%M:%S')}. The active window is: {active_window_title}\n"
+                        f"Previous description: {previous_description or 'none, this is the first screenshot'}",
+            }]
+            for image, caption in images:
+                if caption:
+                    content.append({"type": "text", "text": caption})
+                content.append({"type": "image_url", "image_url": {"url": image.data_url}})
+
+            response = self.privacy_vision.create_chat_completion(
+                system_message=self.custom_instructions.privacy,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=500,
+            )
+            text = response["content"]
+            verdict = json.loads(text[text.index("{"):text.rindex("}") + 1])
+            return verdict if isinstance(verdict, dict) else None
+        except Exception as e:
+            print(f"Failed to triage screenshot with the local model: {e}")
+            return None
+
+    def describe_screenshots(self, screenshots):
+        """Describe several screenshots with a single vision request.
+
+        screenshots is a list of (images, active_window_title, captured_at) tuples in capture
+        order. Returns one description (or None) per screenshot.
+        """
+        if len(screenshots) == 1:
+            return [self.describe_screenshot(*screenshots[0])]
 
-    def handle_user_inquiry(self, user_input: str) -> str:
+        try:
+            system_message = (
+                self.custom_instructions.vision.replace("{capture_interval}", str(self.interval))
+                + "\n" + self.custom_instructions.vision_batch
+            )
+            if self.batch_mode == "mosaic":
+                content = self._mosaic_content(screenshots)
+            else:
+                content = []
+                for number, (images, active_window_title, captured_at) in enumerate(screenshots, start=1):
+                    content.append({
+                        "type": "text",
+                        "text": f"Screenshot {number} taken at {captured_at.strftime('%Y-%m-%d %H:%M:%S')}. The active window is: {active_window_title}",
+                    })
+                    for image, caption in images:
+                        if caption:
+                            content.append({"type": "text", "text": caption})
+                        content.append({"type": "image_url", "image_url": {"url": image.data_url}})
+
+            response = self.vision.create_chat_completion(
+                system_message=system_message,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=min(1000 * len(screenshots), self.vision.provider.get("max_output_tokens", 8192)),
+            )
+            self._record_vision_usage(response, frames=len(screenshots))
+            descriptions = self._split_batch_response(response["content"], len(screenshots))
+        except Exception as e:
+            print(f"Failed to send screenshot batch to vision model: {e}")
+            return [None] * len(screenshots)
+
+        missing = [index for index, description in enumerate(descriptions) if description is None]
+        if missing:
+            print(f"Batch response did not describe screenshot(s) {[index + 1 for index in missing]}, describing them one by one")
+            self.session.metrics.increment("vision_batch_fallbacks")
+            for index in missing:
+                descriptions[index] = self.describe_screenshot(*screenshots[index])
+        return descriptions
+
+    def _record_vision_usage(self, response, frames):
+        input_tokens, output_tokens = usage_tokens(response.get("usage"))
+        metrics = self.session.metrics
+        metrics.increment("vision_requests")
+        metrics.increment("vision_input_tokens", input_tokens)
+        metrics.increment("vision_output_tokens", output_tokens)
+        metrics.observe("vision_tokens_per_frame", (input_tokens + output_tokens) / frames)
+
+    def _mosaic_content(self, screenshots):
+        """Tile the full frame of each screenshot into one labelled mosaic image.
+
+        The full frame is the uncaptioned image; desktop thumbnails and region crops carry captions.
+        """
+        tiles = [decode_image(next((image for image, caption in images if not caption), images[0][0]))
+                 for images, _, _ in screenshots]
+        mosaic = compose_mosaic(tiles, labels=[str(n) for n in range(1, len(tiles) + 1)])
+        lines = [
+            f"Screenshot {number} (tile {number}, left to right, top to bottom) taken at {captured_at.strftime('%Y-%m-%d %H:%M:%S')}. The active window is: {active_window_title}"
+            for number, (_, active_window_title, captured_at) in enumerate(screenshots, start=1)
+        ]
+        return [
+            {"type": "text", "text": "\n".join(lines)},
+            {"type": "image_url", "image_url": {"url": encode_image(mosaic, self.image_format, self.image_quality).data_url}},
+        ]
+
+    def _split_batch_response(self, text, count):
+        """Map a batched JSON response back to per-screenshot descriptions.
+
+        Screenshots the response doesn't describe, or all of them if it isn't the expected JSON, are None.
+        """
+        descriptions = [None] * count
+        try:
+            data = json.loads(text[text.index("{"):text.rindex("}") + 1])
+            for entry in data.get("frames", []):
+                index = int(entry["frame"]) - 1
+                if 0 <= index < count:
+                    descriptions[index] = entry.get("description")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+        return descriptions
+
+    def handle_user_inquiry(self, user_input: str, on_text=None) -> str:
         try:
             # Get suggested context before forming the prompt
             # context = self.context_finder.get_suggested_context(self.session_log_filepath)
@@ -219,24 +589,51 @@ class SessionPrompts:
             # print(f"Context: {context_prompt}")
 
             # Combine with existing prompt logic
-            with open(self.session_log_filepath, "r") as f:
-                log_content = f.read()
+            retrieved = [doc_id for doc_id, _ in self.session.log_index.search(user_input, self.qa_retrieval_top_k)]
+            carried_summary = self.session.current_session.get("carried_summary")
+            log_content = assemble_context(
+                self.session.messages,
+                self.session.summarizer.summaries,
+                self.qa_context_tokens - estimate_tokens(carried_summary or ""),
+                retrieved=retrieved,
+            )
+            # Earlier sessions in a continuation chain are only read if budget remains
+            earlier_context = assemble_lineage_context(
+                carried_summary,
+                self.session.lineage(),
+                self.qa_context_tokens - estimate_tokens(log_content),
+                max_depth=self.continue_max_depth,
+            )
+            if earlier_context:
+                log_content = f"{earlier_context}\n\n{log_content}"
 
             system_message = self.custom_instructions.qa.replace("{capture_interval}", str(self.interval))
-            response = self.qa.create_chat_completion(
-                system_message=system_message,
-                messages=[
-                    {
-                        "role": "assistant",
-                        "content": f"Latest activity log: {log_content}. How can I help you?",
-                    },
-                    {"role": "user", "content": user_input},
-                ],
-            )
+            messages = [
+                {
+                    "role": "assistant",
+                    "content": f"Latest activity log: {log_content}. How can I help you?",
+                },
+                {"role": "user", "content": user_input},
+            ]
+            if on_text:
+                response = self.qa.stream_chat_completion(
+                    system_message=system_message,
+                    messages=messages,
+                    on_text=on_text,
+                )
+                self.session.metrics.observe("qa_time_to_first_token_seconds", response["latency"]["time_to_first_token"])
+                self.session.metrics.observe("qa_total_latency_seconds", response["latency"]["total"])
+            else:
+                response = self.qa.create_chat_completion(
+                    system_message=system_message,
+                    messages=messages,
+                )
             assistant_response = response["content"]
+            if self.cache:
+                self.session.metrics.increment("response_cache_hits" if response.get("cached") else "response_cache_misses")
 
-            self.session.write_to_log(f"USER INQUIRY: {user_input}")
-            self.session.write_to_log(f"ASSISTANT RESPONSE: {assistant_response}")
+            self.session.write_to_log(f"USER INQUIRY: {user_input}", kind="inquiry")
+            self.session.write_to_log(f"ASSISTANT RESPONSE: {assistant_response}", kind="response", model=self.qa.model)
 
             return assistant_response
         except Exception as e:
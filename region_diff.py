@@ -0,0 +1,128 @@
+from PIL import Image, ImageChops
+
+
+def changed_tiles(previous, current, tile_size=32, pixel_threshold=16):
+    """Return (columns, rows, flags) marking which tiles differ between two same-sized frames."""
+    diff = ImageChops.difference(previous.convert("L"), current.convert("L"))
+    changed_pixels = diff.point(lambda v: 255 if v > pixel_threshold else 0)
+    # Box-reduce so each output pixel is the mean of one tile; any changed pixel makes it non-zero
+    grid = changed_pixels.reduce(tile_size)
+    return grid.width, grid.height, [value > 0 for value in grid.getdata()]
+
+
+def tile_boxes(columns, rows, flags, padding=1):
+    """Group changed tiles into bounding boxes (in tile units) of connected components."""
+    seen = set()
+    boxes = []
+    for start in range(len(flags)):
+        if not flags[start] or start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        left, top, right, bottom = columns, rows, 0, 0
+        while stack:
+            index = stack.pop()
+            x, y = index % columns, index // columns
+            left, top = min(left, x), min(top, y)
+            right, bottom = max(right, x + 1), max(bottom, y + 1)
+            for nx in range(x - 1, x + 2):
+                for ny in range(y - 1, y + 2):
+                    neighbour = ny * columns + nx
+                    if 0 <= nx < columns and 0 <= ny < rows and flags[neighbour] and neighbour not in seen:
+                        seen.add(neighbour)
+                        stack.append(neighbour)
+        boxes.append((max(left - padding, 0), max(top - padding, 0),
+                      min(right + padding, columns), min(bottom + padding, rows)))
+    return merge_overlapping(boxes)
+
+
+def merge_overlapping(boxes):
+    merged = list(boxes)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def box_area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+class RegionDiffer:
+    """Finds the changed regions of a frame relative to the previously sent frame.
+
+    plan() returns the pixel boxes to crop, or None when the full frame should be sent
+    (no baseline, size change, a keyframe is due, or too much of the screen changed).
+    The baseline only moves when sent() is called, so frames that are never described
+    (budget exhausted, dropped by backpressure) don't hide changes from the next one.
+    """
+
+    def __init__(self, max_fraction=0.3, tile_size=32, pixel_threshold=16, max_regions=4, keyframe_interval=10):
+        self.max_fraction = max_fraction
+        self.tile_size = tile_size
+        self.pixel_threshold = pixel_threshold
+        self.max_regions = max_regions
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.frames_since_keyframe = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_fraction=config.get("region_crop_max_fraction", 0.3),
+            tile_size=config.get("region_tile_size", 32),
+            pixel_threshold=config.get("region_pixel_threshold", 16),
+            max_regions=config.get("region_max_crops", 4),
+            keyframe_interval=config.get("region_keyframe_interval", 10),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_fraction > 0
+
+    def plan(self, image, full_frame=False):
+        """Return the crop boxes for image, or None for a full frame. Call sent() once it is submitted."""
+        previous = self.previous
+        if (full_frame or not self.enabled or previous is None or previous.size != image.size
+                or self.frames_since_keyframe >= self.keyframe_interval):
+            return None
+
+        columns, rows, flags = changed_tiles(previous, image, self.tile_size, self.pixel_threshold)
+        boxes = tile_boxes(columns, rows, flags)
+        if len(boxes) > self.max_regions:
+            boxes = [(min(b[0] for b in boxes), min(b[1] for b in boxes),
+                      max(b[2] for b in boxes), max(b[3] for b in boxes))]
+
+        if sum(box_area(box) for box in boxes) > self.max_fraction * columns * rows:
+            return None
+
+        return [
+            (left * self.tile_size, top * self.tile_size,
+             min(right * self.tile_size, image.width), min(bottom * self.tile_size, image.height))
+            for left, top, right, bottom in boxes
+        ]
+
+    def sent(self, image, regions):
+        """Make image the baseline for the next plan(). regions is what plan() returned for it."""
+        self.previous = image.copy()
+        self.frames_since_keyframe = 0 if regions is None else self.frames_since_keyframe + 1
+
+    def reset(self):
+        self.previous = None
+        self.frames_since_keyframe = 0
+
+
+def overview_image(image, size=(480, 270)):
+    overview = image.copy()
+    overview.thumbnail(size, Image.BILINEAR)
+    return overview
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """Disk-backed cache of chat completion responses with size-bounded LRU eviction.
+
+    Entries live in a SQLite database keyed by a hash of the request. Each entry may have
+    its own expiry; once the stored responses exceed max_bytes the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, default_ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.logger = logging.getLogger('ResponseCache')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, expires REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the cache if `response_cache_enabled` is set, otherwise return None."""
+        if not config.get("response_cache_enabled", False):
+            return None
+        return cls(
+            config.get("response_cache_path", os.path.join(".cache", "responses.sqlite")),
+            max_bytes=config.get("response_cache_max_bytes", 50 * 1024 * 1024),
+            default_ttl=config.get("response_cache_ttl"),
+        )
+
+    @staticmethod
+    def make_key(provider, model, system_message, messages, max_tokens):
+        request = json.dumps(
+            {"provider": provider, "model": model, "system": system_message, "messages": messages, "max_tokens": max_tokens},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now, now + ttl if ttl else None),
+            )
+            self._evict()
+
+    def _evict(self):
+        self._db.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+        self.logger.debug(f"Evicted {len(victims)} cached responses ({freed} bytes)")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(config):
+    """Return the process-wide cache for the configured path, or None if the cache is disabled."""
+    if not config.get("response_cache_enabled", False):
+        return None
+    path = config.get("response_cache_path", os.path.join(".cache", "responses.sqlite"))
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ResponseCache.from_config(config)
+        return _caches[path]
+
+
+def close_response_caches():
+    """Close every shared cache, on shutdown."""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
@@ -0,0 +1,283 @@
+import bisect
+import io
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from PIL import Image
+
+ARCHIVE_DIR = "archive"
+INDEX_FILENAME = "archive.idx"
+FILENAME_PATTERN = re.compile(r"screenshot_(\d+)\.\w+$")
+
+KEYFRAME, DELTA = 0, 1
+# Archive index entry: (capture timestamp, sequence, segment, byte offset, length, width, height, kind)
+ARCHIVE_ENTRY = struct.Struct("<dIIQIHHB")
+
+
+class ArchiveEntry(NamedTuple):
+    timestamp: float
+    seq: int
+    segment: int
+    offset: int
+    length: int
+    width: int
+    height: int
+    kind: int
+
+
+def screenshot_filename(seq, extension):
+    return f"screenshot_{seq:06d}.{extension}"
+
+
+def _xor(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def _pixels(data):
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        return image.size, image.tobytes()
+
+
+class ScreenshotStore:
+    """Two-tier screenshot storage for a session.
+
+    The newest hot_frames screenshots are kept as individual files. Older ones are packed
+    into segment files under archive/: each segment starts with a keyframe (the screenshot's
+    encoded bytes) followed by up to keyframe_interval - 1 deltas, each the zlib-compressed
+    XOR of a frame's pixels with the previous frame's. A delta larger than the encoded
+    screenshot is stored as a keyframe instead. archive.idx holds one entry per archived
+    frame, so any frame can be found by sequence number or timestamp and rebuilt from the
+    nearest keyframe.
+
+    Retention drops whole segments, oldest first, once they are older than max_age seconds
+    or the store exceeds max_bytes. All writes run on one background thread.
+    """
+
+    def __init__(self, screenshots_dir, hot_frames=120, keyframe_interval=30, max_age=None, max_bytes=None):
+        self.screenshots_dir = screenshots_dir
+        self.archive_dir = os.path.join(screenshots_dir, ARCHIVE_DIR)
+        self.index_filepath = os.path.join(screenshots_dir, INDEX_FILENAME)
+        self.hot_frames = max(hot_frames, 0)
+        self.keyframe_interval = max(keyframe_interval, 1)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger('ScreenshotStore')
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-writer")
+        self._hot = deque()  # (seq, filename, timestamp, nbytes), oldest first
+        self._entries = self._read_index()
+        self._segment_bytes = {}
+        for entry in self._entries:
+            self._segment_bytes[entry.segment] = max(self._segment_bytes.get(entry.segment, 0), entry.offset + entry.length)
+        self._next_seq = self._entries[-1].seq + 1 if self._entries else 0
+        # Pixels of the last archived frame, the base for the next delta
+        self._previous = None
+        self._segment_frames = self.keyframe_interval
+        os.makedirs(self.screenshots_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config, screenshots_dir):
+        return cls(
+            screenshots_dir,
+            hot_frames=config.get("screenshot_hot_frames", 120),
+            keyframe_interval=config.get("screenshot_keyframe_interval", 30),
+            max_age=config.get("screenshot_retention_seconds"),
+            max_bytes=config.get("screenshot_retention_bytes"),
+        )
+
+    def _read_index(self):
+        try:
+            with open(self.index_filepath, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        # A torn final entry from a crash is ignored
+        usable = len(data) - len(data) % ARCHIVE_ENTRY.size
+        return [ArchiveEntry(*fields) for fields in ARCHIVE_ENTRY.iter_unpack(data[:usable])]
+
+    def save(self, encoded, captured_at=None):
+        """Queue the encoded screenshot for writing and return its filename."""
+        timestamp = captured_at.timestamp() if captured_at else time.time()
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        filename = os.path.join(self.screenshots_dir, screenshot_filename(seq, encoded.extension))
+        self._writer.submit(self._store, seq, filename, encoded.data, timestamp)
+        return filename
+
+    def _store(self, seq, filename, data, timestamp):
+        try:
+            with open(filename, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to save screenshot {filename}: {e}")
+            return
+        with self._lock:
+            self._hot.append((seq, filename, timestamp, len(data)))
+        while len(self._hot) > self.hot_frames:
+            oldest = self._hot[0]
+            try:
+                self._archive(oldest)
+                os.remove(oldest[1])
+            except (OSError, ValueError) as e:
+                # The file stays on disk, outside the ring
+                self.logger.warning(f"Failed to archive {oldest[1]}: {e}")
+            with self._lock:
+                self._hot.popleft()
+        try:
+            self._apply_retention(timestamp)
+        except OSError as e:
+            self.logger.warning(f"Failed to apply screenshot retention: {e}")
+
+    def _archive(self, hot):
+        seq, filename, timestamp, _ = hot
+        with open(filename, "rb") as f:
+            data = f.read()
+        size, pixels = _pixels(data)
+        record, kind = data, KEYFRAME
+        new_segment = self._segment_frames >= self.keyframe_interval or self._previous is None or self._previous[0] != size
+        if not new_segment:
+            delta = zlib.compress(_xor(pixels, self._previous[1]), 6)
+            if len(delta) < len(data):
+                record, kind = delta, DELTA
+        if new_segment:
+            segment = seq
+            self._segment_frames = 0
+        else:
+            segment = self._entries[-1].segment
+        os.makedirs(self.archive_dir, exist_ok=True)
+        offset = self._segment_bytes.get(segment, 0)
+        with open(self._segment_path(segment), "ab") as f:
+            f.write(record)
+        entry = ArchiveEntry(timestamp, seq, segment, offset, len(record), size[0], size[1], kind)
+        with open(self.index_filepath, "ab") as f:
+            f.write(ARCHIVE_ENTRY.pack(*entry))
+        with self._lock:
+            self._entries.append(entry)
+            self._segment_bytes[segment] = offset + len(record)
+        self._segment_frames += 1
+        self._previous = (size, pixels)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.archive_dir, f"segment_{segment:06d}.bin")
+
+    def _apply_retention(self, now):
+        """Delete the oldest archive segments past max_age or over max_bytes. The open segment is kept."""
+        if not self.max_age and not self.max_bytes:
+            return
+        with self._lock:
+            if not self._entries:
+                return
+            current = self._entries[-1].segment
+            last_timestamps = {}
+            for entry in self._entries:
+                last_timestamps[entry.segment] = entry.timestamp
+            expired = []
+            total = self.total_bytes()
+            for segment in sorted(last_timestamps):
+                if segment == current:
+                    break
+                if (self.max_age and last_timestamps[segment] < now - self.max_age) or (self.max_bytes and total > self.max_bytes):
+                    expired.append(segment)
+                    total -= self._segment_bytes[segment]
+                else:
+                    break
+            if not expired:
+                return
+            dropped = set(expired)
+            self._entries = [entry for entry in self._entries if entry.segment not in dropped]
+            for segment in expired:
+                del self._segment_bytes[segment]
+            entries = list(self._entries)
+        self._write_index(entries)
+        for segment in expired:
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+        self.logger.info(f"Retention removed {len(expired)} archive segment(s)")
+
+    def _write_index(self, entries):
+        tmp_path = f"{self.index_filepath}.tmp"
+        with open(tmp_path, "wb") as f:
+            for entry in entries:
+                f.write(ARCHIVE_ENTRY.pack(*entry))
+        os.replace(tmp_path, self.index_filepath)
+
+    def total_bytes(self):
+        """Bytes on disk for hot files and archive segments (call with the lock held or for display)."""
+        return sum(nbytes for _, _, _, nbytes in self._hot) + sum(self._segment_bytes.values())
+
+    def load(self, key):
+        """Return a screenshot as a PIL image by sequence number or filename, or None if it's gone."""
+        if isinstance(key, str):
+            match = FILENAME_PATTERN.search(key)
+            if not match:
+                return None
+            key = int(match.group(1))
+        with self._lock:
+            hot = next((filename for seq, filename, _, _ in self._hot if seq == key), None)
+            entries = list(self._entries)
+        if hot:
+            with Image.open(hot) as image:
+                return image.convert("RGB")
+        position = bisect.bisect_left([entry.seq for entry in entries], key)
+        if position == len(entries) or entries[position].seq != key:
+            return None
+        return self._rebuild(entries, position)
+
+    def frame_at(self, timestamp):
+        """Return the last screenshot taken at or before timestamp (epoch seconds), or None."""
+        with self._lock:
+            candidates = [(entry.timestamp, entry.seq) for entry in self._entries]
+            candidates += [(ts, seq) for seq, _, ts, _ in self._hot]
+        candidates.sort()
+        position = bisect.bisect_right(candidates, (timestamp, float("inf")))
+        if position == 0:
+            return None
+        return self.load(candidates[position - 1][1])
+
+    def _rebuild(self, entries, position):
+        target = entries[position]
+        start = position
+        while entries[start].kind != KEYFRAME:
+            start -= 1
+        with open(self._segment_path(target.segment), "rb") as f:
+            f.seek(entries[start].offset)
+            data = f.read(target.offset + target.length - entries[start].offset)
+        base = entries[start].offset
+        size, pixels = _pixels(data[:entries[start].length])
+        for entry in entries[start + 1:position + 1]:
+            pixels = _xor(pixels, zlib.decompress(data[entry.offset - base:entry.offset - base + entry.length]))
+        return Image.frombytes("RGB", size, pixels)
+
+    def close(self):
+        """Wait for queued writes to finish."""
+        self._writer.shutdown(wait=True)
+
+    @staticmethod
+    def scan(screenshots_dir):
+        """(frame count, bytes) of a session's screenshots on disk, hot and archived."""
+        frame_count, nbytes = 0, 0
+        if not os.path.isdir(screenshots_dir):
+            return frame_count, nbytes
+        for entry in os.scandir(screenshots_dir):
+            if entry.is_file() and FILENAME_PATTERN.search(entry.name):
+                frame_count += 1
+                nbytes += entry.stat().st_size
+        index_filepath = os.path.join(screenshots_dir, INDEX_FILENAME)
+        if os.path.exists(index_filepath):
+            frame_count += os.path.getsize(index_filepath) // ARCHIVE_ENTRY.size
+        archive_dir = os.path.join(screenshots_dir, ARCHIVE_DIR)
+        if os.path.isdir(archive_dir):
+            nbytes += sum(entry.stat().st_size for entry in os.scandir(archive_dir) if entry.is_file())
+        return frame_count, nbytes
@@ -1,9 +1,17 @@
 import os
+import json
+import threading
 from datetime import datetime
 import logging
 
 from capture import SessionCaptures
 from prompting import SessionPrompts
+from metrics import SessionMetrics, MetricsReporter, MetricsServer
+from summarizer import LogSummarizer
+from log_index import BM25Index
+from trace_log import MessageLog, TraceLog
+from catalog import SessionCatalog, OBJECTIVE_PREFIX
+from budget import BudgetGovernor
 # from context import ContextHandler
 
 # Configure logging
@@ -22,46 +30,133 @@ class SessionManager:
 
         self.prompts = None 
         self.captures = None
+        self.summarizer = None
+        self.metrics_reporter = None
+        self.budget = None
+        self.metrics = SessionMetrics()
+        self.log_index = BM25Index()
+        self.trace_log = None
+        # Message entries by number, matching log_index doc ids
+        self.messages = None
+        self._log_lock = threading.Lock()
 
         # Create sessions directory if it doesn't exist
         os.makedirs(self.sessions_dir, exist_ok=True)
+        self.catalog = SessionCatalog(self.sessions_dir)
+        # Reads self.metrics on each scrape, so it follows the current session
+        self.metrics_server = MetricsServer.from_config(
+            config,
+            lambda: self.metrics.snapshot(),
+            labels=lambda: {"session": self.current_session['session_id']} if self.current_session else {},
+        )
         self.logger.info(f"Initialized SessionManager with sessions directory: {self.sessions_dir}")
     
-    def write_to_log(self, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(self.current_session['session_log_filepath'], 'a') as log_file:
-            log_file.write(f"[{timestamp}] {message}\n")
+    def write_to_log(self, message, timestamp=None, kind="note", **fields):
+        """Append a typed record to the trace log; records with a message also appear in the text view."""
+        with self._log_lock, self.metrics.timer("stage_log_write_seconds"):
+            position = len(self.trace_log)
+            self.trace_log.append(kind, message, timestamp, **fields)
+            if message is not None:
+                self.log_index.add(message)
+                self.messages.append(position)
+        if self.summarizer:
+            self.summarizer.notify()
+
+    def set_objective(self, objective):
+        self.write_to_log(f"{OBJECTIVE_PREFIX}{objective}", kind="note")
+        self.catalog.set_objective(self.current_session['session_id'], objective)
+
+    def record_capture(self, nbytes, model=None):
+        """Count a captured frame (and the bytes stored for it) in the session catalog."""
+        self.catalog.record_capture(self.current_session['session_id'], nbytes, model)
+
+    def close_session(self):
+        """Stop capturing and summarizing the current session and mark it closed in the catalog."""
+        if self.captures:
+            self.captures.stop(timeout=self.config.get('shutdown_timeout', 10))
+            self.captures = None
+        self.budget = None
+        if self.summarizer:
+            self.summarizer.stop()
+            self.summarizer = None
+        if self.metrics_reporter:
+            self.metrics_reporter.stop()
+            self.metrics_reporter = None
+        elif self.current_session:
+            self.save_metrics()
+        if self.current_session:
+            self.catalog.close(self.current_session['session_id'])
+
+    def save_metrics(self):
+        try:
+            self.metrics.save(self.current_session['metrics_filepath'])
+        except OSError as e:
+            self.logger.warning(f"Failed to save session metrics: {e}")
+
+    def _session_data(self, session_id):
+        session_dir = os.path.join(self.sessions_dir, session_id)
+        metadata = self._read_metadata(session_dir)
+        return {
+            'session_id': session_id,
+            'session_dir': session_dir,
+            'session_log_filepath': os.path.join(session_dir, "trace_log.txt"),
+            'screenshots_dir': os.path.join(session_dir, "screenshots"),
+            'metrics_filepath': os.path.join(session_dir, "metrics.json"),
+            'parent_session_id': metadata.get('parent_session_id'),
+            'carried_summary': metadata.get('carried_summary'),
+        }
+
+    def _read_metadata(self, session_dir):
+        try:
+            with open(os.path.join(session_dir, "session.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_metadata(self, session_dir, metadata):
+        tmp_path = os.path.join(session_dir, "session.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, os.path.join(session_dir, "session.json"))
+
+    def lineage(self, session=None):
+        """Lazily yield the ancestors of a session (parent first) by following parent_session_id."""
+        session = session or self.current_session
+        seen = {session['session_id']}
+        parent_id = session.get('parent_session_id')
+        while parent_id and parent_id not in seen:
+            parent = self._session_data(parent_id)
+            if not os.path.isdir(parent['session_dir']):
+                self.logger.warning(f"Parent session not found: {parent_id}")
+                return
+            yield parent
+            seen.add(parent_id)
+            parent_id = parent['parent_session_id']
 
     def get_most_recent_session(self):
         """Get the most recent session directory"""
         try:
             self.logger.info("Attempting to find most recent session")
-            sessions = [d for d in os.listdir(self.sessions_dir) 
-                       if os.path.isdir(os.path.join(self.sessions_dir, d))]
-            
-            if not sessions:
+            most_recent = self.catalog.most_recent()
+            if most_recent and not os.path.isdir(os.path.join(self.sessions_dir, most_recent)):
+                self.logger.warning(f"Catalog is out of date, {most_recent} no longer exists")
+                self.catalog.rebuild()
+                most_recent = self.catalog.most_recent()
+
+            if not most_recent:
                 self.logger.info("No previous sessions found")
                 return None
-            
-            # Sort sessions by name (which is datetime-based) to get the most recent
-            sessions.sort(reverse=True)
-            most_recent = sessions[0]
             self.logger.info(f"Found most recent session: {most_recent}")
             
-            session_data = {
-                'session_id': most_recent,
-                'session_dir': os.path.join(self.sessions_dir, most_recent),
-                'session_log_filepath': os.path.join(self.sessions_dir, most_recent, "trace_log.txt"),
-                'screenshots_dir': os.path.join(self.sessions_dir, most_recent, "screenshots")
-            }
+            session_data = self._session_data(most_recent)
             
             # Verify the trace log file exists
             if not os.path.exists(session_data['session_log_filepath']):
                 self.logger.warning(f"Trace log file not found in recent session: {session_data['session_log_filepath']}")
                 raise Exception(f"Trace log file not found in recent session: {session_data['session_log_filepath']}")
 
-            # Verify contents of trace log file are not empty
-            if os.path.getsize(session_data['session_log_filepath']) == 0:
+            # Verify contents of trace log file are not empty (a continued session may rely on its parent)
+            if os.path.getsize(session_data['session_log_filepath']) == 0 and not session_data['parent_session_id']:
                 self.logger.warning(f"Trace log file is empty: {session_data['session_log_filepath']}")
                 raise Exception(f"Trace log file is empty: {session_data['session_log_filepath']}")
 
@@ -70,8 +165,22 @@ class SessionManager:
             self.logger.error(f"Error getting most recent session: {str(e)}", exc_info=True)
             return None
     
-    def create_new_session(self, continue_from=None):
-        """Create a new session with datetime-based ID"""
+    def _summarize_for_continuation(self, previous_session):
+        """Carry over the previous session's own session summary, falling back to its carried summary."""
+        try:
+            with open(os.path.join(previous_session['session_dir'], "summaries.json"), "r") as f:
+                session_summary = (json.load(f).get("session") or {}).get("summary")
+        except (OSError, ValueError):
+            session_summary = None
+        parts = [p for p in (previous_session.get('carried_summary'), session_summary) if p]
+        return "\n\n".join(parts) or None
+
+    def create_new_session(self, continue_from=None, carried_summary=None):
+        """Create a new session with datetime-based ID.
+
+        A continued session doesn't copy its parent's log. It records the parent's ID and a
+        compact carried-over summary, and readers walk the parent chain on demand.
+        """
         try:
             session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
             session_dir = os.path.join(self.sessions_dir, session_id)
@@ -88,25 +197,40 @@ class SessionManager:
                 log_file.write("")
             self.logger.debug(f"Created session directories: {session_dir}")
             
-            # If continuing from previous session, copy the trace log
+            parent_session_id = None
             if continue_from:
                 self.logger.debug(f"Attempting to continue from previous session: {continue_from['session_id']}")
-                if os.path.exists(continue_from['session_log_filepath']):
-                    import shutil
-                    shutil.copy2(continue_from['session_log_filepath'], session_log_filepath)
-                    self.logger.debug(f"Copied trace log from previous session: {continue_from['session_log_filepath']} -> {session_log_filepath}")
+                if os.path.isdir(continue_from['session_dir']):
+                    parent_session_id = continue_from['session_id']
+                    carried_summary = carried_summary or self._summarize_for_continuation(continue_from)
                 else:
-                    self.logger.warning(f"Previous session trace log not found: {continue_from['session_log_filepath']}")
-            
-            self.current_session = {
+                    self.logger.warning(f"Previous session not found: {continue_from['session_dir']}")
+            created_at = datetime.now()
+            self._write_metadata(session_dir, {
                 'session_id': session_id,
-                'session_dir': session_dir,
-                'session_log_filepath': session_log_filepath,
-                'screenshots_dir': screenshots_dir,
-            }
+                'parent_session_id': parent_session_id,
+                'carried_summary': carried_summary if parent_session_id else None,
+                'created_at': created_at.isoformat(timespec='seconds'),
+            })
+            self.close_session()
+            self.catalog.create(session_id, parent_session_id, created_at)
+
+            self.current_session = self._session_data(session_id)
+            self.metrics = SessionMetrics()
+            self.trace_log = TraceLog(session_log_filepath)
+            self.log_index = BM25Index()
+            self.messages = MessageLog(self.trace_log)
+            for position, entry in self.trace_log.entries_from(0):
+                self.log_index.add(entry.message)
+                self.messages.append(position)
 
             self.prompts = SessionPrompts(self)
+            self.summarizer = LogSummarizer.from_config(self)
+            self.summarizer.start()
+            self.metrics_reporter = MetricsReporter.from_config(self)
+            self.metrics_reporter.start()
             self.captures = SessionCaptures(self)
+            self.budget = BudgetGovernor.from_config(self)
             self.captures.start()
             
             self.logger.debug(f"Successfully created new session: {session_id}")
@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import threading
+
+from trace_log import TraceLog
+from utils import estimate_tokens
+
+
+class LogSummarizer:
+    """Maintains rolling summaries of the trace log in the background.
+
+    Three levels are kept in summaries.json next to the log:
+    - chunks: one summary per `chunk_entries` log entries
+    - hours: one summary per completed hour, built from that hour's chunk summaries
+    - session: one summary of the whole session, built from the hour summaries
+    """
+
+    def __init__(self, session, chunk_entries=50, poll_interval=60):
+        self.session = session
+        self.chunk_entries = chunk_entries
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger('LogSummarizer')
+        self.summaries_filepath = os.path.join(session.current_session['session_dir'], "summaries.json")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._summaries = self._load()
+
+    @classmethod
+    def from_config(cls, session):
+        return cls(
+            session,
+            chunk_entries=session.config.get("summary_chunk_entries", 50),
+            poll_interval=session.config.get("summary_poll_interval", 60),
+        )
+
+    @property
+    def summaries(self):
+        with self._lock:
+            return json.loads(json.dumps(self._summaries))
+
+    def _load(self):
+        try:
+            with open(self.summaries_filepath, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"chunks": [], "hours": [], "session": None}
+
+    def _save(self):
+        tmp_path = f"{self.summaries_filepath}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._summaries, f, indent=2)
+        os.replace(tmp_path, self.summaries_filepath)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-summarizer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def notify(self):
+        """Called after log writes so a completed chunk is summarized promptly."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.update()
+            except Exception as e:
+                self.logger.error(f"Failed to update summaries: {e}", exc_info=True)
+
+    def update(self):
+        """Summarize any newly completed chunks, then roll them up into hours and the session.
+
+        Only records past the last summarized chunk are read, and only once enough of them
+        have been written to possibly complete a chunk.
+        """
+        trace_log = self.session.trace_log
+        chunks = self._summaries["chunks"]
+        start = chunks[-1]["end"] if chunks else 0
+        position = self._resume_position(trace_log, chunks)
+        if len(trace_log) - position < self.chunk_entries:
+            return
+        pending = trace_log.entries_from(position)
+        changed = False
+
+        while len(pending) >= self.chunk_entries:
+            span, pending = pending[:self.chunk_entries], pending[self.chunk_entries:]
+            end = start + self.chunk_entries
+            summary = self.session.prompts.summarize("\n".join(entry.render() for _, entry in span), "log entries")
+            with self._lock:
+                chunks.append({
+                    "start": start, "end": end,
+                    "start_time": span[0][1].timestamp, "end_time": span[-1][1].timestamp,
+                    "record_end": span[-1][0] + 1,
+                    "summary": summary,
+                })
+                self._save()
+            start, changed = end, True
+
+        if not changed:
+            return
+
+        # An hour is complete once a chunk starts in a later hour
+        current_hour = (pending[-1][1] if pending else span[-1][1]).timestamp[:13]
+        hours = self._summaries["hours"]
+        done_hours = {h["hour"] for h in hours}
+        by_hour = {}
+        for chunk in chunks:
+            by_hour.setdefault(chunk["start_time"][:13], []).append(chunk)
+        for hour in sorted(by_hour):
+            if hour >= current_hour or hour in done_hours:
+                continue
+            hour_chunks = by_hour[hour]
+            summary = self.session.prompts.summarize("\n\n".join(c["summary"] for c in hour_chunks), f"summaries of the hour {hour}:00")
+            with self._lock:
+                hours.append({
+                    "hour": hour, "start": hour_chunks[0]["start"], "end": hour_chunks[-1]["end"],
+                    "summary": summary,
+                })
+                hours.sort(key=lambda h: h["start"])
+                self._save()
+
+        covered = chunks[-1]["end"]
+        sources = [h["summary"] for h in hours] + [c["summary"] for c in chunks if not hours or c["start"] >= hours[-1]["end"]]
+        summary = self.session.prompts.summarize("\n\n".join(sources), "summaries of the session so far")
+        with self._lock:
+            self._summaries["session"] = {"end": covered, "summary": summary}
+            self._save()
+
+    @staticmethod
+    def _resume_position(trace_log, chunks):
+        """Record position just past the last summarized chunk."""
+        if not chunks:
+            return 0
+        if "record_end" in chunks[-1]:
+            return chunks[-1]["record_end"]
+        # Summaries written before record positions were kept: find it once by counting entries
+        entries = trace_log.entries_from(0)
+        end = chunks[-1]["end"]
+        position = entries[end - 1][0] + 1 if end <= len(entries) else len(trace_log)
+        chunks[-1]["record_end"] = position
+        return position
+
+
+def assemble_context(log, summaries, token_budget, raw_share=0.6, retrieved=()):
+    """Build the activity log text for a Q&A prompt within token_budget.
+
+    log is a MessageLog, read only as far back as the budget reaches plus the retrieved entries.
+    The most recent entries are included verbatim (up to raw_share of the budget, or all of
+    them if the whole log fits). Older entries listed in retrieved (entry numbers, best match
+    first) come next, using up to half of what is left. Older spans are then represented by
+    the finest-grained summaries that still fit: chunk summaries first, then hour summaries,
+    then the session summary.
+    """
+    count = len(log)
+    rendered, costs = {}, {}
+
+    def load(numbers):
+        numbers = [number for number in numbers if number not in rendered]
+        for number, entry in zip(numbers, log.entries(numbers)):
+            rendered[number] = entry.render()
+            costs[number] = estimate_tokens(rendered[number])
+
+    # Newest entries in growing windows, until they exceed the budget or the log runs out
+    loaded_from, total, window = count, 0, 64
+    while loaded_from > 0 and total <= token_budget:
+        start = max(loaded_from - window, 0)
+        load(range(start, loaded_from))
+        total += sum(costs[number] for number in range(start, loaded_from))
+        loaded_from, window = start, window * 4
+    if total <= token_budget:
+        return "\n".join(rendered[number] for number in range(count))
+
+    # Raw tail, newest first
+    remaining = token_budget
+    tail_start = count
+    while tail_start > 0 and costs[tail_start - 1] <= remaining - (1 - raw_share) * token_budget:
+        tail_start -= 1
+        remaining -= costs[tail_start]
+
+    chunks = [c for c in summaries.get("chunks", []) if c["end"] <= tail_start]
+    # Entries between the last summarized chunk and the raw tail have no summary yet, so they
+    # may take up to half of what is left for summaries
+    covered_end = chunks[-1]["end"] if chunks else 0
+    summary_reserve = remaining / 2
+    while tail_start > covered_end and costs[tail_start - 1] <= remaining - summary_reserve:
+        tail_start -= 1
+        remaining -= costs[tail_start]
+
+    matches = []
+    retrieval_budget = remaining / 2
+    retrieved = [index for index in retrieved if index < tail_start]
+    load(retrieved)
+    for index in retrieved:
+        if index >= tail_start or costs[index] > retrieval_budget:
+            continue
+        matches.append(index)
+        retrieval_budget -= costs[index]
+        remaining -= costs[index]
+
+    sections = []
+    covered_start = tail_start
+    for chunk in reversed(chunks):
+        if chunk["end"] > covered_start:
+            continue
+        text = f"Summary of activity from {chunk['start_time']} to {chunk['end_time']}: {chunk['summary']}"
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            break
+        sections.insert(0, text)
+        remaining -= cost
+        covered_start = chunk["start"]
+
+    for hour in reversed(summaries.get("hours", [])):
+        if hour["end"] > covered_start:
+            continue
+        text = f"Summary of activity during {hour['hour']}:00: {hour['summary']}"
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            break
+        sections.insert(0, text)
+        remaining -= cost
+        covered_start = hour["start"]
+
+    session_summary = summaries.get("session")
+    if covered_start > 0 and session_summary:
+        text = f"Summary of the session so far: {session_summary['summary']}"
+        if estimate_tokens(text) <= remaining:
+            sections.insert(0, text)
+
+    if matches:
+        sections.append("Earlier log entries relevant to the question:\n" + "\n".join(rendered[i] for i in sorted(matches)))
+    sections.append("Recent activity log:\n" + "\n".join(rendered[number] for number in range(tail_start, count)))
+    return "\n\n".join(sections)
+
+
+def _tail_within_budget(trace_log, token_budget):
+    """Most recent rendered entries of a trace log that fit in token_budget, oldest first.
+
+    Returns (lines, cost, filled), where filled tells whether the budget ran out before the log did.
+    """
+    total = len(trace_log)
+    window = 64
+    while True:
+        lines, cost = [], 0
+        for record in reversed(trace_log.tail(window)):
+            if "message" not in record:
+                continue
+            line = f"[{record['time']}] {record['message']}"
+            line_cost = estimate_tokens(line)
+            if cost + line_cost > token_budget:
+                return lines[::-1], cost, True
+            lines.append(line)
+            cost += line_cost
+        if window >= total:
+            return lines[::-1], cost, False
+        window *= 4
+
+
+def assemble_lineage_context(carried_summary, ancestors, token_budget, max_depth=3):
+    """Context from the sessions a continued session descends from, within token_budget.
+
+    Starts with the summary carried over at continuation, then walks ancestors (parent
+    first, read lazily from the ancestors iterable) adding each one's most recent entries
+    until the budget or max_depth runs out. Returns "" when there is nothing to add.
+    """
+    remaining = token_budget
+    header = []
+    if carried_summary:
+        text = f"Summary of earlier sessions: {carried_summary}"
+        cost = estimate_tokens(text)
+        if cost <= remaining:
+            header.append(text)
+            remaining -= cost
+
+    sections = []
+    for depth, ancestor in enumerate(ancestors, start=1):
+        if depth > max_depth or remaining <= 0:
+            break
+        lines, cost, filled = _tail_within_budget(TraceLog(ancestor['session_log_filepath']), remaining)
+        if not lines:
+            # An empty log (a session closed right away) says nothing about its own ancestors
+            if filled:
+                break
+            continue
+        sections.insert(0, f"Log of earlier session {ancestor['session_id']} (most recent entries):\n" + "\n".join(lines))
+        remaining -= cost
+
+    return "\n\n".join(header + sections)
@@ -1,7 +1,9 @@
 from typing import Dict, List, Optional
 import re
 import os
+from collections import deque
 from dataclasses import dataclass
+from trace_log import TraceLog
 
 @dataclass
 class ContextSuggestion:
@@ -55,10 +57,14 @@ class SuggestedContextFinder:
             return ContextSuggestion()
             
         try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                # Read last N lines for recent context
-                lines = f.readlines()[-recent_lines:]
-                text = ''.join(lines)
+            if os.path.exists(os.path.splitext(log_file)[0] + ".jsonl"):
+                # Seek straight to the last N records through the trace log index
+                records = TraceLog(log_file).tail(recent_lines)
+                text = '\n'.join(r['message'] for r in records if 'message' in r)
+            else:
+                with open(log_file, 'r', encoding='utf-8') as f:
+                    # Read last N lines for recent context
+                    text = ''.join(deque(f, maxlen=recent_lines))
                 
             files = self.extract_file_paths(text)
             context = ContextSuggestion()
@@ -0,0 +1,250 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+ENTRY_PATTERN = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] ", re.MULTILINE)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+RECORD_TYPES = ("capture", "window", "vision", "inquiry", "response", "note", "budget")
+
+# Sidecar index entry: (sort key timestamp, byte offset of the record in the JSONL file)
+INDEX_ENTRY = struct.Struct("<dQ")
+
+
+
+class LogEntry(NamedTuple):
+    timestamp: str
+    message: str
+
+    def render(self):
+        return f"[{self.timestamp}] {self.message}"
+
+
+def parse_log_entries(text):
+    """Split trace log text into entries; a message may span several lines."""
+    matches = list(ENTRY_PATTERN.finditer(text))
+    entries = []
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        entries.append(LogEntry(match.group(1), text[match.end():end].rstrip("\n")))
+    return entries
+
+
+def read_log_entries(log_filepath):
+    with open(log_filepath, "r") as f:
+        return parse_log_entries(f.read())
+
+
+def _map(path):
+    """Read-only mmap of a file, or None if it is missing or empty."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+class TraceLog:
+    """Append-only JSONL activity log with a binary (timestamp, offset) index.
+
+    Each record is one JSON line with a type (see RECORD_TYPES), an epoch `ts`, the
+    formatted `time`, an optional `message` and any extra fields. The sidecar .idx file
+    holds one fixed-size entry per record so time-range and tail reads seek straight to
+    the right offset through mmap instead of scanning the file. The legacy
+    `[timestamp] message` text log is derived from the records as they are written.
+
+    Records are written in capture order, so one may carry a timestamp older than records
+    before it (a slow vision call). The largest such lag is kept in the .lag sidecar, and
+    range reads scan that far past their end. Logs without one are scanned to the end.
+    """
+
+    def __init__(self, text_filepath):
+        base, _ = os.path.splitext(text_filepath)
+        self.text_filepath = text_filepath
+        self.records_filepath = f"{base}.jsonl"
+        self.index_filepath = f"{base}.idx"
+        self.lag_filepath = f"{base}.lag"
+        self._lock = threading.Lock()
+        self._last_key = 0.0
+        if os.path.exists(self.records_filepath):
+            self._max_lag = self._read_lag()
+        else:
+            self._max_lag = 0.0
+            self._write_lag(0.0)
+            if os.path.exists(self.text_filepath):
+                self._import_text_view()
+        index = _map(self.index_filepath)
+        if index is not None:
+            with index:
+                self._last_key = INDEX_ENTRY.unpack_from(index, len(index) - INDEX_ENTRY.size)[0]
+
+    def _import_text_view(self):
+        """Build records and index from a text-only log written before the JSONL format."""
+        for entry in read_log_entries(self.text_filepath):
+            timestamp = datetime.strptime(entry.timestamp, TIMESTAMP_FORMAT)
+            self._append_record({"type": "note", "ts": timestamp.timestamp(), "time": entry.timestamp, "message": entry.message})
+
+    def append(self, kind, message=None, timestamp=None, **fields):
+        if kind not in RECORD_TYPES:
+            raise ValueError(f"Unknown trace record type: {kind}")
+        timestamp = timestamp or datetime.now()
+        record = {"type": kind, "ts": timestamp.timestamp(), "time": timestamp.strftime(TIMESTAMP_FORMAT)}
+        if message is not None:
+            record["message"] = message
+        record.update(fields)
+        with self._lock:
+            self._append_record(record)
+            if message is not None:
+                with open(self.text_filepath, "a") as text_file:
+                    text_file.write(f"[{record['time']}] {message}\n")
+        return record
+
+    def _append_record(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.records_filepath, "ab") as records_file:
+            records_file.seek(0, os.SEEK_END)
+            offset = records_file.tell()
+            records_file.write(line)
+        # Index keys never decrease so they can be binary searched
+        lag = self._last_key - record["ts"]
+        if self._max_lag is not None and lag > self._max_lag:
+            self._max_lag = lag
+            self._write_lag(lag)
+        self._last_key = max(self._last_key, record["ts"])
+        with open(self.index_filepath, "ab") as index_file:
+            index_file.write(INDEX_ENTRY.pack(self._last_key, offset))
+
+    def _read_lag(self):
+        """Largest number of seconds a record's timestamp trails the one before it, or None if unknown."""
+        try:
+            with open(self.lag_filepath, "r") as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_lag(self, lag):
+        tmp_path = f"{self.lag_filepath}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(repr(lag))
+        os.replace(tmp_path, self.lag_filepath)
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.index_filepath) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def _read_from(self, position, stop_key=None):
+        """Yield records starting at index position, stopping after stop_key if given."""
+        index = _map(self.index_filepath)
+        if index is None:
+            return
+        records = _map(self.records_filepath)
+        with index, records:
+            count = len(index) // INDEX_ENTRY.size
+            for i in range(position, count):
+                key, offset = INDEX_ENTRY.unpack_from(index, i * INDEX_ENTRY.size)
+                if stop_key is not None and key > stop_key:
+                    return
+                end = records.find(b"\n", offset)
+                yield json.loads(records[offset:end if end != -1 else len(records)])
+
+    def _lower_bound(self, key):
+        """First index position whose key is >= key."""
+        index = _map(self.index_filepath)
+        if index is None:
+            return 0
+        with index:
+            low, high = 0, len(index) // INDEX_ENTRY.size
+            while low < high:
+                mid = (low + high) // 2
+                if INDEX_ENTRY.unpack_from(index, mid * INDEX_ENTRY.size)[0] < key:
+                    low = mid + 1
+                else:
+                    high = mid
+            return low
+
+    def records(self, start=None, end=None, kinds=None):
+        """Records with start <= timestamp <= end (datetimes, both optional), in log order."""
+        start_ts = start.timestamp() if start else None
+        end_ts = end.timestamp() if end else None
+        position = self._lower_bound(start_ts) if start_ts is not None else 0
+        stop_key = end_ts + self._max_lag if end_ts is not None and self._max_lag is not None else None
+        for record in self._read_from(position, stop_key):
+            if start_ts is not None and record["ts"] < start_ts:
+                continue
+            if end_ts is not None and record["ts"] > end_ts:
+                continue
+            if kinds and record["type"] not in kinds:
+                continue
+            yield record
+
+    def tail(self, count, kinds=None):
+        """The last count records (of the given kinds), oldest first."""
+        total = len(self)
+        if not kinds:
+            return list(self._read_from(max(total - count, 0)))
+        # Walk back in growing windows until enough matching records are found
+        window = count
+        while True:
+            position = max(total - window, 0)
+            matching = [r for r in self._read_from(position) if r["type"] in kinds]
+            if len(matching) >= count or position == 0:
+                return matching[-count:]
+            window *= 4
+
+    def records_at(self, positions):
+        """Records at the given index positions, in the order given."""
+        index = _map(self.index_filepath)
+        if index is None:
+            return []
+        records = _map(self.records_filepath)
+        with index, records:
+            result = []
+            for position in positions:
+                _, offset = INDEX_ENTRY.unpack_from(index, position * INDEX_ENTRY.size)
+                end = records.find(b"\n", offset)
+                result.append(json.loads(records[offset:end if end != -1 else len(records)]))
+            return result
+
+    def entries(self):
+        """Records that carry a message, as LogEntry tuples (the text view)."""
+        return [LogEntry(r["time"], r["message"]) for r in self._read_from(0) if "message" in r]
+
+    def entries_from(self, position):
+        """(record position, LogEntry) for records from index position on that carry a message."""
+        return [(position + offset, LogEntry(r["time"], r["message"]))
+                for offset, r in enumerate(self._read_from(position)) if "message" in r]
+
+    def render_text(self):
+        """Regenerate the legacy text log from the records."""
+        return "".join(f"{entry.render()}\n" for entry in self.entries())
+
+
+class MessageLog:
+    """The records of a trace log that carry a message, numbered like the text view and BM25Index.
+
+    Only each entry's record position is kept in memory; entries are read on demand.
+    """
+
+    def __init__(self, trace_log, positions=()):
+        self.trace_log = trace_log
+        self.positions = list(positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def append(self, position):
+        self.positions.append(position)
+
+    def entries(self, numbers):
+        """LogEntry tuples for the given entry numbers, in the order given."""
+        records = self.trace_log.records_at([self.positions[number] for number in numbers])
+        return [LogEntry(record["time"], record["message"]) for record in records]
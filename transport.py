@@ -0,0 +1,190 @@
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+
+# Rate-limit headers sent alongside successful responses, as (remaining, reset) pairs
+RATE_LIMIT_HEADERS = [
+    ("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),  # OpenAI
+    ("x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+    ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset"),  # Anthropic
+    ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"),
+]
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_delay(value, now=None):
+    """Parse a rate-limit reset/Retry-After header value into seconds from now.
+
+    Accepts plain seconds ("2", "0.5"), OpenAI durations ("1m30s", "250ms"),
+    HTTP dates and RFC 3339 timestamps. Returns None when the value can't be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    now = now or datetime.now(timezone.utc)
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+
+    for parse in (datetime.fromisoformat, parsedate_to_datetime):
+        try:
+            reset_at = parse(value)
+        except (TypeError, ValueError):
+            continue
+        if reset_at.tzinfo is None:
+            reset_at = reset_at.replace(tzinfo=timezone.utc)
+        return max((reset_at - now).total_seconds(), 0.0)
+    return None
+
+
+class ProviderTransport:
+    """Pooled, retrying HTTP transport shared by every Client of one provider.
+
+    Provider entries may override:
+    - timeout: per-request timeout in seconds (default 60)
+    - max_concurrency: requests allowed in flight at once (default 2)
+    - pool_maxsize: keep-alive connections kept per host (default 10)
+    - max_retries: retries on connection errors and 408/429/5xx (default 3)
+    - backoff_base / backoff_max: exponential backoff bounds in seconds (default 0.5 / 30)
+    - max_retry_after: longest Retry-After or rate-limit reset honored, in seconds (default 120,
+      never below backoff_max)
+    """
+
+    def __init__(self, provider):
+        self.name = provider.get("provider", "unknown")
+        self.logger = logging.getLogger('ProviderTransport')
+        self.timeout = provider.get("timeout", 60)
+        self.max_concurrency = provider.get("max_concurrency", 2)
+        self.max_retries = provider.get("max_retries", 3)
+        self.backoff_base = provider.get("backoff_base", 0.5)
+        self.backoff_max = provider.get("backoff_max", 30)
+        self.max_retry_after = max(provider.get("max_retry_after", 120), self.backoff_max)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=provider.get("pool_connections", 4),
+            pool_maxsize=provider.get("pool_maxsize", 10),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(max(self.max_concurrency, 1))
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        delay = parse_reset_delay(response.headers.get("retry-after-ms"))
+        if delay is not None:
+            delay /= 1000
+        else:
+            delay = parse_reset_delay(response.headers.get("retry-after"))
+        return None if delay is None else min(delay, self.max_retry_after)
+
+    def _observe_rate_limits(self, response):
+        """Hold back further requests until the provider's quota resets once it is exhausted."""
+        for remaining_header, reset_header in RATE_LIMIT_HEADERS:
+            remaining = response.headers.get(remaining_header)
+            if remaining is None or remaining.strip() != "0":
+                continue
+            delay = parse_reset_delay(response.headers.get(reset_header))
+            if delay:
+                self._block_for(min(delay, self.max_retry_after))
+
+    def _block_for(self, delay):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        self.logger.info(f"{self.name}: rate limited, holding requests for {delay:.2f}s")
+
+    def _wait_until_unblocked(self):
+        while True:
+            with self._lock:
+                delay = self._blocked_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def post(self, url, headers, json, stream=False):
+        """POST with retries. A streamed response keeps its concurrency slot until it is closed."""
+        attempt = 0
+        while True:
+            self._wait_until_unblocked()
+            self._slots.acquire()
+            holding = True
+            try:
+                try:
+                    response = self.session.post(url, headers=headers, json=json, timeout=self.timeout, stream=stream)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self.backoff_delay(attempt)
+                    self.logger.warning(f"{self.name}: {type(e).__name__}, retrying in {delay:.2f}s")
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                        self._observe_rate_limits(response)
+                        if stream:
+                            self._release_on_close(response)
+                            holding = False
+                        return response
+                    retry_after = self._retry_after(response)
+                    delay = retry_after if retry_after is not None else self.backoff_delay(attempt)
+                    response.close()
+                    self.logger.warning(f"{self.name}: HTTP {response.status_code}, retrying in {delay:.2f}s")
+                    if response.status_code == 429:
+                        self._block_for(delay)
+            finally:
+                if holding:
+                    self._slots.release()
+            attempt += 1
+            time.sleep(delay)
+
+    def _release_on_close(self, response):
+        """Hand the caller's slot to the response, released once when it is closed."""
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            try:
+                close()
+            finally:
+                if not released:
+                    released = True
+                    self._slots.release()
+
+        response.close = close_and_release
+
+    def close(self):
+        self.session.close()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(provider):
+    """Return the shared transport for a provider entry, creating it on first use."""
+    key = (provider.get("provider"), provider.get("base_url"))
+    with _transports_lock:
+        if key not in _transports:
+            _transports[key] = ProviderTransport(provider)
+        return _transports[key]
@@ -1,122 +1,103 @@
-import os
 import io
 import base64
-import pyautogui
-from PIL import Image
+import math
+import re
+from PIL import Image, ImageDraw
 from datetime import datetime
-import platform
-import subprocess
+from typing import NamedTuple
+
+from capture_backends import get_capture_backend
 
 SCREENSHOT_DIR = "screenshots"
 MAX_IMAGE_SIZE = (2000, 768)
 
-def capture_and_save_screenshot(screenshot_counter, screenshots_dir="screenshots"):
-    # Create screenshots directory if it doesn't exist
-    os.makedirs(screenshots_dir, exist_ok=True)
-    
-    # Capture the screenshot
-    screenshot = pyautogui.screenshot()
-    
-    # Resize screenshot
-    resized_screenshot = resize_image(screenshot)
-
-    # Save screenshot to file
-    filename = os.path.join(screenshots_dir, f"screenshot_{screenshot_counter:04d}.png")
-    resized_screenshot.save(filename)
-
-    # Convert resized screenshot to base64
-    img_byte_array = io.BytesIO()
-    resized_screenshot.save(img_byte_array, format='PNG')
-    base64_image = base64.b64encode(img_byte_array.getvalue()).decode('utf-8')
-
-    return filename, base64_image
-
-def resize_image(image):
-    """Resize the image to fit within MAX_IMAGE_SIZE while maintaining aspect ratio."""
-    image.thumbnail(MAX_IMAGE_SIZE, Image.LANCZOS)
+IMAGE_FORMATS = {
+    # format name: (PIL format, mime type, file extension)
+    "png": ("PNG", "image/png", "png"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    extension: str
+
+    @property
+    def base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+
+def capture_and_save_screenshot(store):
+    """Grab, encode and hand the screenshot to a ScreenshotStore. Returns (filename, base64 data)."""
+    encoded = encode_image(capture_screenshot())
+    filename = store.save(encoded)
+    return filename, encoded.base64
+
+def capture_screenshot(backend=None):
+    """Grab the screen and resize it to fit within MAX_IMAGE_SIZE."""
+    return resize_image((backend or get_capture_backend()).grab())
+
+def encode_image(image, image_format="png", quality=80):
+    """Encode the image once; the bytes are reused for the disk copy and the upload."""
+    pil_format, mime_type, extension = IMAGE_FORMATS[image_format]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    options = {"quality": quality} if pil_format in ("JPEG", "WEBP") else {"compress_level": 6}
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return EncodedImage(buffer.getvalue(), mime_type, extension)
+
+def decode_image(encoded):
+    return Image.open(io.BytesIO(encoded.data))
+
+def compose_mosaic(images, labels=None, size=MAX_IMAGE_SIZE):
+    """Tile images into a grid that fits within size, optionally labelling each tile."""
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    cell_width, cell_height = size[0] // columns, size[1] // rows
+    mosaic = Image.new("RGB", (cell_width * columns, cell_height * rows), (0, 0, 0))
+    draw = ImageDraw.Draw(mosaic)
+    for index, image in enumerate(images):
+        tile = image.convert("RGB")
+        tile.thumbnail((cell_width - 2, cell_height - 2), Image.BILINEAR)
+        x, y = (index % columns) * cell_width, (index // columns) * cell_height
+        mosaic.paste(tile, (x + 1, y + 1))
+        if labels:
+            draw.rectangle((x, y, x + 24, y + 16), fill=(255, 255, 0))
+            draw.text((x + 4, y + 2), labels[index], fill=(0, 0, 0))
+    return mosaic
+
+def resize_image(image, size=MAX_IMAGE_SIZE):
+    """Resize the image to fit within size (MAX_IMAGE_SIZE by default) while maintaining aspect ratio."""
+    image.thumbnail(size, Image.LANCZOS)
     return image
 
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
+    """Cheap local estimate of the number of tokens a model will see for text.
+
+    Words count as one token per ~4 characters and each punctuation mark as one token,
+    which tracks BPE tokenizers closely enough for budgeting prompts.
+    """
+    return sum(-(-len(token) // 4) if token[0].isalnum() or token[0] == "_" else 1
+               for token in _TOKEN_PATTERN.findall(text))
+
 def append_log(message, log_file_path):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     with open(log_file_path, "a") as log_file:
         log_file.write(f"[{timestamp}] {message}\n")
 
 def get_active_window_title():
-    system = platform.system()
-
-    if system == "Darwin":  # macOS
-        try:
-            script = '''
-            tell application "System Events"
-                set frontApp to name of first application process whose frontmost is true
-                set windowTitle to ""
-                tell process frontApp
-                    if exists (1st window whose value of attribute "AXMain" is true) then
-                        set windowTitle to name of 1st window whose value of attribute "AXMain" is true
-                    end if
-                end tell
-                return {frontApp, windowTitle}
-            end tell
-            '''
-            result = subprocess.run(["osascript", "-e", script], capture_output=True, text=True, check=True)
-            output = result.stdout.strip().split(", ", 1)
-            app_name = output[0]
-            window_title = output[1] if len(output) > 1 else ""
-            return f"{app_name}: {window_title}" if window_title else app_name
-        except subprocess.CalledProcessError:
-            return "Unknown"
-        except Exception as e:
-            return f"Error: {str(e)}"
-
-    elif system == "Windows":
-        try:
-            import win32gui
-            window = win32gui.GetForegroundWindow()
-            return win32gui.GetWindowText(window)
-        except ImportError:
-            return "win32gui not installed"
-        except:
-            return "Unknown"
-
-    else:
-        return f"Unsupported OS: {system}"
+    return get_capture_backend().active_window().title
 
 def get_active_window_id():
     """Get a unique identifier for the active window."""
-    return get_active_window_title()
-    system = platform.system()
-
-    if system == "Darwin":  # macOS
-        try:
-            script = '''
-            tell application "System Events"
-                set frontApp to first application process whose frontmost is true
-                set appName to name of frontApp
-                set windowId to ""
-                tell frontApp
-                    if (count of windows) > 0 then
-                        set windowId to id of window 1
-                    end if
-                end tell
-                return {appName & ":" & windowId}
-            end tell
-            '''
-            result = subprocess.run(["osascript", "-e", script], capture_output=True, text=True, check=True)
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
-            return "unknown:0"
-        except Exception as e:
-            return f"error:{str(e)}"
-
-    elif system == "Windows":
-        try:
-            import win32gui
-            hwnd = win32gui.GetForegroundWindow()
-            return f"{win32gui.GetWindowText(hwnd)}:{hwnd}"
-        except ImportError:
-            return "win32gui_not_installed:0"
-        except Exception as e:
-            return f"error:{str(e)}"
-
-    else:
-        return f"unsupported_os_{system}:0"
\ No newline at end of file
+    return get_capture_backend().active_window().id